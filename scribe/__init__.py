@@ -1,10 +1,39 @@
+from typing import TYPE_CHECKING, Any
 from dotenv import load_dotenv
-from .qna import QnA
-from .llm import LLM
-from .summary import Summary
-from .similarity import Similarity
-from .grammar import GrammarCorrector
+import importlib
+
+if TYPE_CHECKING:
+    from .qna import QnA
+    from .llm import LLM
+    from .summary import Summary
+    from .similarity import Similarity
+    from .grammar import GrammarCorrector
 
 __all__ = ["QnA", "LLM", "Summary", "Similarity", "GrammarCorrector"]
 
+# Public names and the submodule that defines them. The submodules pull in
+# torch, transformers, spaCy, sklearn and the LLM SDKs, so they are only
+# imported the first time one of these names is accessed.
+_LAZY_IMPORTS = {
+    "QnA": ".qna",
+    "LLM": ".llm",
+    "Summary": ".summary",
+    "Similarity": ".similarity",
+    "GrammarCorrector": ".grammar",
+}
+
 load_dotenv()
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,45 +1,175 @@
 from fastapi import FastAPI, HTTPException, Query
-from typing import List
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterator, List, Literal, Optional
+import asyncio
+import json
 import uvicorn
 import logging
+import os
 
-from .grammar import GrammarCorrector
-from .llm import LLM
-from .qna import QnA
-from .similarity import Similarity, find_common_text
-from .summary import Summary
+from .batching import bert_batchers, sbert_batcher
+from .executor import Overloaded, limiter
+from .executor import stats as limiter_stats
+from .models import MODELS, WARMUP_TEXT, registry
+from .utils import fast_split
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
+def warmup_models() -> Optional[List[str]]:
+    """
+    Models to warm up at startup, from `SCRIBE_WARMUP`: a comma separated
+    list of model names, or "all". Unset or empty disables warmup.
+    """
+    value = os.environ.get("SCRIBE_WARMUP", "").strip()
+    if not value:
+        return None
+    if value.lower() == "all":
+        return MODELS
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def warmup(names: List[str]) -> None:
+    registry.warmup(names)
+    # NLTK loads its punkt data on the first sentence split, split the way
+    # the grammar corrector does.
+    tokenizer = registry.get("grammar").tokenizer if "grammar" in names else None
+    fast_split(WARMUP_TEXT, 100, tokenizer)
+
+
+async def run_warmup(app: FastAPI, names: List[str]) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, warmup, names)
+        app.state.ready = True
+    except Exception as e:
+        logger.error(f"Error warming up models: {e}")
+        app.state.warmup_error = str(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    names = warmup_models()
+    app.state.warmup_error = None
+    app.state.ready = names is None
+
+    # Warm up in the background so /healthz answers while models load.
+    task = asyncio.create_task(run_warmup(app, names)) if names else None
+    yield
+    if task is not None:
+        task.cancel()
+
+
 app = FastAPI(
     title="Scribe API",
     description="Use scribe functinos through an API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-try:
-    llm = LLM()
-    summary_model = Summary()
-    similarity_calculator = Similarity()
-    qna_model = QnA()
-    grammar_corrector = GrammarCorrector()
-except Exception as e:
-    print(f"Error initializing models: {e}")
-    exit(1)
+
+async def get_model(name: str) -> Any:
+    """
+    `registry.get` off the event loop: the first call imports or loads the
+    model.
+    """
+    return await asyncio.to_thread(registry.get, name)
+
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail=str(e), headers={"Retry-After": "1"}
+    )
+
+
+async def sse_events(chunks: AsyncIterator[Any]) -> AsyncIterator[str]:
+    """
+    Format chunks as Server-Sent Events, text is sent as `{"text": ...}` and
+    anything else as JSON. The stream ends with a `done` event, or an `error`
+    event if generation failed half way.
+    """
+    try:
+        async for chunk in chunks:
+            event = {"text": chunk} if isinstance(chunk, str) else chunk
+            yield f"data: {json.dumps(event)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    except Exception as e:
+        logger.error(f"Error while streaming: {e}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+
+async def iterate_in_limiter(name: str, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """
+    Advance a blocking iterator step by step in the model's limiter.
+
+    The first step runs before this returns, so a full limiter raises
+    `Overloaded` while the endpoint can still answer with a 503.
+    """
+    done = object()
+    first = await limiter(name).run(next, iterator, done)
+
+    async def steps() -> AsyncIterator[Any]:
+        item = first
+        while item is not done:
+            yield item
+            item = await limiter(name).run(next, iterator, done)
+
+    return steps()
+
+
+def sse_response(chunks: AsyncIterator[Any]) -> StreamingResponse:
+    return StreamingResponse(
+        sse_events(chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # === API Endpoints ===
 
 
+@app.get("/healthz")
+async def healthz_endpoint():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz_endpoint():
+    if not app.state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming_up", "error": app.state.warmup_error},
+        )
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    metrics = {"models": registry.stats(), "limiters": limiter_stats()}
+    if registry.is_loaded("Similarity"):
+        metrics["embedding_cache"] = registry.get("Similarity").embedding_cache.stats()
+    if registry.is_loaded("llm") and registry.get("llm").cache is not None:
+        metrics["llm_cache"] = registry.get("llm").cache.stats()
+    return metrics
+
+
 @app.post("/llm/summarize")
 async def llm_summarize_endpoint(
     text: str = Query(..., description="Text to summarize"),
     max_tokens: int = Query(100, description="Maximum tokens in summary"),
     temperature: float = Query(0.3, description="Temperature for LLM"),
+    map_reduce: bool = Query(
+        False, description="Summarize chunks in parallel, then merge them"
+    ),
+    fan_out: int = Query(4, ge=1, description="Chunks summarized at once"),
 ):
     try:
-        summary_text = llm.summarize(text, max_tokens, temperature)
+        llm = await get_model("llm")
+        summary_text = await llm.asummarize(
+            text, max_tokens, temperature, map_reduce=map_reduce, fan_out=fan_out
+        )
         return {"summary": summary_text}
     except Exception as e:
         raise HTTPException(
@@ -47,12 +177,23 @@ async def llm_summarize_endpoint(
         )  # Convert error to string
 
 
+@app.post("/llm/summarize/stream")
+async def llm_summarize_stream_endpoint(
+    text: str = Query(..., description="Text to summarize"),
+    max_tokens: int = Query(100, description="Maximum tokens in summary"),
+    temperature: float = Query(0.3, description="Temperature for LLM"),
+):
+    llm = await get_model("llm")
+    return sse_response(llm.astream_summarize(text, max_tokens, temperature))
+
+
 @app.post("/llm/grammar_correct")
 async def llm_grammar_correct_endpoint(
     text: str = Query(..., description="Text to correct"),
 ):
     try:
-        corrected_text = llm.grammar_corrector(text)
+        llm = await get_model("llm")
+        corrected_text = await llm.agrammar_corrector(text)
         return {"corrected_text": corrected_text}
     except Exception as e:
         raise HTTPException(
@@ -60,13 +201,22 @@ async def llm_grammar_correct_endpoint(
         )
 
 
+@app.post("/llm/grammar_correct/stream")
+async def llm_grammar_correct_stream_endpoint(
+    text: str = Query(..., description="Text to correct"),
+):
+    llm = await get_model("llm")
+    return sse_response(llm.astream_grammar_corrector(text))
+
+
 @app.post("/llm/answer_question")
 async def llm_answer_question_endpoint(
     question: str = Query(..., description="Question to answer"),
     context: str = Query(..., description="Context for answering"),
 ):
     try:
-        answer = llm.answer_question(question, context)
+        llm = await get_model("llm")
+        answer = await llm.aanswer_question(question, context)
         return {"answer": answer}
     except Exception as e:
         raise HTTPException(
@@ -74,26 +224,95 @@ async def llm_answer_question_endpoint(
         )
 
 
+@app.post("/llm/answer_question/stream")
+async def llm_answer_question_stream_endpoint(
+    question: str = Query(..., description="Question to answer"),
+    context: str = Query(..., description="Context for answering"),
+):
+    llm = await get_model("llm")
+    return sse_response(llm.astream_answer_question(question, context))
+
+
 @app.post("/grammar/correct")
 async def grammar_correct_endpoint(
     text: str = Query(..., description="Text to correct"),
+    batch_size: int = Query(8, ge=1, description="Chunks corrected per model call"),
+    stream: bool = Query(
+        False,
+        description="Stream {paragraph_id, text} events as chunks are corrected",
+    ),
 ):
     try:
-        corrected_text = grammar_corrector.correct(text)
+        grammar_corrector = await get_model("GrammarCorrector")
+        if stream:
+            corrections = await iterate_in_limiter(
+                "grammar",
+                grammar_corrector.iter_correct(text, batch_size=batch_size),
+            )
+            return sse_response(
+                (
+                    {"paragraph_id": paragraph_id, "text": chunk}
+                    async for paragraph_id, chunk in corrections
+                )
+            )
+
+        corrected_text = await limiter("grammar").run(
+            grammar_corrector.correct, text, batch_size=batch_size
+        )
         return {"corrected_text": corrected_text}
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error correcting grammar: {str(e)}"
         )
 
 
+def dense_similarity(embeddings: Any) -> List[List[float]]:
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    return cosine_similarity(embeddings).tolist()
+
+
+async def similarity_matrix(embeddings: Any) -> dict:
+    """
+    The full N×N cosine similarity matrix of `embeddings`.
+    """
+    matrix = await limiter("similarity").run(dense_similarity, embeddings)
+    return {"similarity_matrix": matrix}
+
+
+async def similarity_pairs(
+    embeddings: Any, top_k: Optional[int], threshold: Optional[float]
+) -> dict:
+    """
+    Sparse (i, j, score) pairs of `embeddings`, computed in row blocks.
+    """
+    from .similarity import cosine_neighbours
+
+    pairs = await limiter("similarity").run(
+        cosine_neighbours, embeddings, top_k, threshold
+    )
+    return {"pairs": pairs}
+
+
 @app.post("/similarity/sbert")
 async def sbert_similarity_endpoint(
     sentences: List[str] = Query(..., description="List of sentences"),
+    top_k: Optional[int] = Query(
+        None, description="Return only each item's top-k neighbours as pairs"
+    ),
+    threshold: Optional[float] = Query(
+        None, description="Return only the pairs scoring at least this"
+    ),
 ):
     try:
-        similarity_matrix = similarity_calculator.sbert_similarity(sentences)
-        return {"similarity_matrix": similarity_matrix}
+        embeddings = await sbert_batcher.submit(sentences)
+        if top_k is not None or threshold is not None:
+            return await similarity_pairs(embeddings, top_k, threshold)
+        return await similarity_matrix(embeddings)
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error calculating similarity: {str(e)}"
@@ -103,10 +322,23 @@ async def sbert_similarity_endpoint(
 @app.post("/similarity/tfidf_cosine")
 async def tfidf_cosine_similarity_endpoint(
     sentences: List[str] = Query(..., description="List of sentences"),
+    top_k: Optional[int] = Query(
+        None, description="Return only each item's top-k neighbours as pairs"
+    ),
+    threshold: Optional[float] = Query(
+        None, description="Return only the pairs scoring at least this"
+    ),
 ):
     try:
-        similarity_matrix = similarity_calculator.tfidf_cosine_similarity(sentences)
-        return {"similarity_matrix": similarity_matrix}
+        similarity_calculator = await get_model("Similarity")
+        similarity_matrix = await limiter("tfidf").run(
+            similarity_calculator.tfidf_cosine_similarity, sentences, top_k, threshold
+        )
+        if top_k is not None or threshold is not None:
+            return {"pairs": similarity_matrix}
+        return {"similarity_matrix": similarity_matrix.tolist()}
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -114,40 +346,217 @@ async def tfidf_cosine_similarity_endpoint(
         )
 
 
+@app.post("/similarity/tfidf/index")
+async def tfidf_index_endpoint(
+    texts: List[str] = Query(..., description="Texts to add to the TF-IDF index"),
+    ids: Optional[List[str]] = Query(None, description="One id per text"),
+    refit: bool = Query(
+        False, description="Learn a new vocabulary from these texts, dropping the rest"
+    ),
+):
+    if ids is not None and len(ids) != len(texts):
+        raise HTTPException(status_code=422, detail="Expected one id per text")
+
+    try:
+        index = await get_model("tfidf_index")
+        if refit:
+            await limiter("tfidf").run(index.fit, texts, ids)
+        else:
+            await limiter("tfidf").run(index.add, texts, ids)
+        return {"added": len(texts), "size": len(index)}
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error adding to the TF-IDF index: {str(e)}"
+        )
+
+
+@app.post("/similarity/tfidf/search")
+async def tfidf_search_endpoint(
+    text: str = Query(..., description="Text to compare with the TF-IDF index"),
+    top_k: int = Query(10, description="Number of documents to return"),
+):
+    try:
+        index = await get_model("tfidf_index")
+
+        def search():
+            index.refresh()
+            return index.search([text], top_k)
+
+        (results,) = await limiter("tfidf").run(search)
+        return {"results": [{"id": i, "score": score} for i, score in results]}
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error searching the TF-IDF index: {str(e)}"
+        )
+
+
 @app.post("/similarity/bert")
 async def bert_similarity_endpoint(
     sentences: List[str] = Query(..., description="List of sentences"),
+    top_k: Optional[int] = Query(
+        None, description="Return only each item's top-k neighbours as pairs"
+    ),
+    threshold: Optional[float] = Query(
+        None, description="Return only the pairs scoring at least this"
+    ),
+    pooling: Literal["cls", "mean"] = Query(
+        "cls", description="[CLS] token or mean of the token embeddings"
+    ),
 ):
     try:
-        similarity_matrix = similarity_calculator.bert_similarity(sentences)
-        return {"similarity_matrix": similarity_matrix}
+        embeddings = await bert_batchers[pooling].submit(sentences)
+        if top_k is not None or threshold is not None:
+            return await similarity_pairs(embeddings, top_k, threshold)
+        return await similarity_matrix(embeddings)
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error calculating BERT similarity: {str(e)}"
         )
 
 
+@app.post("/similarity/index")
+async def similarity_index_endpoint(
+    texts: List[str] = Query(..., description="Texts to add to the index"),
+    ids: Optional[List[str]] = Query(
+        None, description="One id per text, defaults to a hash of the text"
+    ),
+    train: bool = Query(
+        False, description="Recluster the index for approximate search"
+    ),
+):
+    if ids is not None and len(ids) != len(texts):
+        raise HTTPException(status_code=422, detail="Expected one id per text")
+
+    try:
+        if ids is None:
+            import hashlib
+
+            ids = [hashlib.sha256(t.encode("utf-8")).hexdigest()[:16] for t in texts]
+
+        index = await get_model("index")
+        embeddings = await sbert_batcher.submit(texts)
+        await limiter("index").run(index.add, ids, embeddings)
+        if train:
+            await limiter("index").run(index.train)
+        return {"added": len(texts), "size": len(index), "trained": index.trained}
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error adding to the index: {str(e)}"
+        )
+
+
+@app.post("/similarity/search")
+async def similarity_search_endpoint(
+    text: str = Query(..., description="Text to find neighbours of"),
+    top_k: int = Query(10, description="Number of neighbours to return"),
+    mode: Literal["exact", "approximate"] = Query(
+        "exact", description="Scan every vector, or only the closest clusters"
+    ),
+    n_probe: int = Query(8, description="Clusters scanned in approximate mode"),
+    rescore: Optional[int] = Query(
+        None, description="Candidates reranked with float32 vectors (quantized index)"
+    ),
+):
+    try:
+        index = await get_model("index")
+        embeddings = await sbert_batcher.submit([text])
+
+        def search():
+            index.refresh()
+            return index.search(
+                embeddings,
+                top_k,
+                n_probe if mode == "approximate" else None,
+                rescore=rescore,
+            )
+
+        (results,) = await limiter("index").run(search)
+        return {"results": [{"id": i, "score": score} for i, score in results]}
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error searching the index: {str(e)}"
+        )
+
+
 @app.post("/similarity/find_common_text")
 async def find_common_text_endpoint(
     text1: str = Query(..., description="First text"),
     text2: str = Query(..., description="Second text"),
+    offsets: bool = Query(
+        False, description="Return the offsets of every match in both texts"
+    ),
 ):
     try:
-        common_text = find_common_text(text1, text2)
+        from .overlap import find_common_spans, find_common_text
+
+        func = find_common_spans if offsets else find_common_text
+        common_text = await limiter("text").run(func, text1, text2)
         return common_text
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error finding common text: {str(e)}"
         )
 
 
+@app.post("/similarity/find_common_text/many")
+async def find_common_text_many_endpoint(
+    reference: str = Query(..., description="Text to compare the others with"),
+    texts: List[str] = Query(..., description="Texts to compare with the reference"),
+):
+    try:
+        from .overlap import find_common_spans_many
+
+        results = await limiter("text").run(find_common_spans_many, reference, texts)
+        return {"results": results}
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error finding common text: {str(e)}"
+        )
+
+
+@app.post("/qna/answer")
+async def qna_answer_endpoint(
+    question: str = Query(..., description="Question to answer"),
+    context: str = Query(..., description="Context for answering"),
+    threshold: float = Query(
+        0.3, description="Minimum extractive score before falling back to the LLM"
+    ),
+):
+    try:
+        qna_model = await get_model("QnA")
+        return await qna_model.aanswer(
+            question, context, threshold, runner=limiter("qna").run
+        )
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error answering question: {str(e)}"
+        )
+
+
 @app.post("/qna/generate_questions")
 async def qna_generate_questions_endpoint(
     text: str = Query(..., description="Text to generate questions from"),
     num_questions: int = Query(5, description="Number of questions"),
 ):
     try:
-        questions = qna_model.generate_questions(text, num_questions)
+        qna_model = await get_model("QnA")
+        questions = await qna_model.agenerate_questions(text, num_questions)
         return {"questions": questions}
     except Exception as e:
         raise HTTPException(
@@ -160,9 +569,17 @@ async def qna_evaluate_answers_endpoint(
     questions: List[str] = Query(..., description="List of questions"),
     user_answers: List[str] = Query(..., description="List of user answers"),
     context: str = Query(..., description="Context for evaluating answers"),
+    mode: Literal["single", "batched", "concurrent"] = Query(
+        "batched",
+        description="One LLM call per answer, or per batch of answers",
+    ),
+    batch_size: int = Query(20, description="Answers graded per LLM call"),
 ):
     try:
-        results = qna_model.evaluate_answers(questions, user_answers, context)
+        qna_model = await get_model("QnA")
+        results = await qna_model.aevaluate_answers(
+            questions, user_answers, context, mode=mode, batch_size=batch_size
+        )
         return {"results": results}
     except Exception as e:
         raise HTTPException(
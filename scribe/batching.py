@@ -0,0 +1,174 @@
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Set, Tuple
+from collections import deque
+import asyncio
+import os
+
+from .executor import limiter
+from .models import registry
+
+Runner = Callable[..., Awaitable[Any]]
+
+
+async def _run_in_default_executor(func: Callable[[List[Any]], Any], batch: List[Any]):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, batch)
+
+
+class MicroBatcher:
+    """
+    Merges the inputs of concurrent requests into one batched call.
+
+    Callers `submit` their own list of items. Items are collected for at most
+    `max_wait_ms` (or until `max_batch_size` items are waiting), `func` runs
+    once on the whole batch, and each caller gets back the slice of the result
+    that belongs to its items. `func` must return one row per input item.
+
+    `runner` executes `func(batch)` off the event loop, e.g.
+    `executor.limiter("sbert").run`, so the batcher also honours the model's
+    concurrency and queue limits.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[List[Any]], Any],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        runner: Optional[Runner] = None,
+    ):
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.runner = runner or _run_in_default_executor
+
+        self._pending: Deque[Tuple[List[Any], asyncio.Future]] = deque()
+        self._pending_size = 0
+        self._full: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, items: List[Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._full is None or self._loop is not loop:
+            # The event and tasks belong to one event loop. Start over when
+            # the batcher is used from another (e.g. a later `asyncio.run`),
+            # items left from a closed loop can no longer be answered.
+            self._full = asyncio.Event()
+            self._loop = loop
+            self._collector = None
+            self._pending.clear()
+            self._pending_size = 0
+
+        future = loop.create_future()
+        self._pending.append((list(items), future))
+        self._pending_size += len(items)
+
+        if self._pending_size >= self.max_batch_size:
+            self._full.set()
+
+        if self._collector is None or self._collector.done():
+            self._collector = loop.create_task(self._collect())
+
+        return await future
+
+    async def _collect(self) -> None:
+        # Never leave callers waiting on a collector that died.
+        try:
+            await self._collect_batches()
+        except asyncio.CancelledError:
+            self._fail_pending(None)
+            raise
+        except Exception as e:
+            self._fail_pending(e)
+
+    def _fail_pending(self, error: Optional[Exception]) -> None:
+        while self._pending:
+            _, future = self._pending.popleft()
+            if future.done():
+                continue
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
+        self._pending_size = 0
+
+    async def _collect_batches(self) -> None:
+        assert self._full is not None
+
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+
+            batch = []
+            size = 0
+            while self._pending and (
+                not batch or size + len(self._pending[0][0]) <= self.max_batch_size
+            ):
+                items, future = self._pending.popleft()
+                batch.append((items, future))
+                size += len(items)
+
+            self._pending_size -= size
+            if self._pending_size >= self.max_batch_size:
+                self._full.set()
+
+            # Dispatch without waiting, the runner bounds how many batches
+            # run at once.
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[List[Any], asyncio.Future]]) -> None:
+        flat = [item for items, _ in batch for item in items]
+
+        try:
+            result = await self.runner(self.func, flat)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for items, future in batch:
+            if not future.done():
+                future.set_result(result[offset : offset + len(items)])
+            offset += len(items)
+
+
+def batcher(
+    name: str, func: Callable[[List[Any]], Any], runner: Optional[Runner] = None
+) -> MicroBatcher:
+    """
+    A batcher for model `name`, configured from `SCRIBE_<NAME>_BATCH_SIZE`
+    and `SCRIBE_<NAME>_BATCH_WAIT_MS`.
+    """
+    prefix = f"SCRIBE_{name.upper()}"
+    return MicroBatcher(
+        func,
+        max_batch_size=int(os.environ.get(f"{prefix}_BATCH_SIZE") or 64),
+        max_wait_ms=float(os.environ.get(f"{prefix}_BATCH_WAIT_MS") or 5.0),
+        runner=runner,
+    )
+
+
+# Shared by the API and the retriever, so encoding requests from concurrent
+# callers are merged into one forward pass.
+sbert_batcher = batcher(
+    "sbert",
+    lambda texts: registry.get("Similarity").sbert_encode(texts),
+    runner=limiter("sbert").run,
+)
+bert_batchers = {
+    pooling: batcher(
+        "bert",
+        lambda texts, pooling=pooling: registry.get("Similarity").bert_encode(
+            texts, pooling=pooling
+        ),
+        runner=limiter("bert").run,
+    )
+    for pooling in ("cls", "mean")
+}
@@ -0,0 +1,242 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+from .storage import flock
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of text embeddings, so only texts that were not
+    seen before go through the model.
+
+    Embeddings are keyed by the model name and the SHA-256 of the text. The
+    last `memory_size` of them are kept in memory. When `path` is set they
+    are also stored on disk, in that directory: one append-only float32 file
+    per model, read through a memory map, and a SQLite index from text hash
+    to row. The files survive restarts and can be shared by every worker on
+    a host, appends are serialised with a file lock.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS models (
+        model TEXT PRIMARY KEY,
+        dim INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS embeddings (
+        model TEXT NOT NULL,
+        key TEXT NOT NULL,
+        row INTEGER NOT NULL,
+        PRIMARY KEY (model, key)
+    );
+    """
+
+    # SQLite limits the number of parameters of a single statement.
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 4096):
+        self.path = path
+        self.memory_size = memory_size
+
+        self._memory: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._maps: Dict[str, np.memmap] = {}
+        self._dims: Dict[str, int] = {}
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            self._connection().executescript(self._SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        """
+        The cache configured by `SCRIBE_EMBEDDING_CACHE` (a directory, unset
+        keeps embeddings in memory only) and `SCRIBE_EMBEDDING_CACHE_SIZE`
+        (embeddings kept in memory).
+        """
+        memory_size = os.environ.get("SCRIBE_EMBEDDING_CACHE_SIZE")
+        return cls(
+            os.environ.get("SCRIBE_EMBEDDING_CACHE") or None,
+            memory_size=int(memory_size) if memory_size else 4096,
+        )
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def encode(self, model: str, texts: Sequence[str], encode: Encoder) -> np.ndarray:
+        """
+        Embeddings of `texts` by `model`, one row per text. Only the texts
+        missing from the cache are passed to `encode`, once each.
+        """
+        texts = list(texts)
+        if not texts:
+            return encode(texts)
+
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get((model, key))
+                if vector is not None and key not in found:
+                    self._memory.move_to_end((model, key))
+                    found[key] = vector
+                    self._counters["memory_hits"] += 1
+
+        if self.path and len(found) < len(set(keys)):
+            stored = self._load(model, [key for key in keys if key not in found])
+            with self._lock:
+                for key, vector in stored.items():
+                    self._remember(model, key, vector)
+                self._counters["disk_hits"] += len(stored)
+            found.update(stored)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors = np.asarray(encode(list(missing.values())), dtype=np.float32)
+            new = dict(zip(missing, vectors))
+            if self.path:
+                self._store(model, new)
+            with self._lock:
+                for key, vector in new.items():
+                    self._remember(model, key, vector)
+                self._counters["misses"] += len(new)
+            found.update(new)
+
+        return np.stack([found[key] for key in keys])
+
+    def _remember(self, model: str, key: str, vector: np.ndarray) -> None:
+        # Called with self._lock held.
+        self._memory[(model, key)] = vector
+        self._memory.move_to_end((model, key))
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            assert self.path is not None
+            conn = sqlite3.connect(
+                os.path.join(self.path, "index.sqlite"),
+                timeout=30,
+                isolation_level=None,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _file(self, model: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, re.sub(r"[^\w.-]", "_", model) + ".f32")
+
+    def _dim(self, model: str) -> Optional[int]:
+        if model not in self._dims:
+            row = self._connection().execute(
+                "SELECT dim FROM models WHERE model = ?", (model,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._dims[model] = row[0]
+        return self._dims[model]
+
+    def _rows(self, model: str, dim: int, needed: int) -> np.memmap:
+        """
+        A memory map of the model's file holding at least `needed` rows,
+        remapped when other writers have appended since it was opened.
+        """
+        with self._lock:
+            rows = self._maps.get(model)
+            if rows is None or len(rows) < needed:
+                count = os.path.getsize(self._file(model)) // (dim * 4)
+                rows = np.memmap(
+                    self._file(model), dtype=np.float32, mode="r", shape=(count, dim)
+                )
+                self._maps[model] = rows
+            return rows
+
+    def _load(self, model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        dim = self._dim(model)
+        if dim is None:
+            return {}
+
+        conn = self._connection()
+        unique = list(dict.fromkeys(keys))
+        located: Dict[str, int] = {}
+        for start in range(0, len(unique), self._LOOKUP_BATCH):
+            batch = unique[start : start + self._LOOKUP_BATCH]
+            located.update(
+                conn.execute(
+                    "SELECT key, row FROM embeddings WHERE model = ? AND key IN "
+                    f"({','.join('?' * len(batch))})",
+                    (model, *batch),
+                ).fetchall()
+            )
+
+        if not located:
+            return {}
+
+        rows = self._rows(model, dim, max(located.values()) + 1)
+        vectors = np.array(rows[list(located.values())])
+        return dict(zip(located, vectors))
+
+    def _store(self, model: str, new: Dict[str, np.ndarray]) -> None:
+        vectors = np.ascontiguousarray(np.stack(list(new.values())), dtype=np.float32)
+        dim = vectors.shape[1]
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR IGNORE INTO models (model, dim) VALUES (?, ?)", (model, dim)
+        )
+        if self._dim(model) != dim:
+            raise ValueError(
+                f"Embeddings of '{model}' have {dim} dimensions, "
+                f"the cache holds {self._dim(model)}"
+            )
+
+        with open(self._file(model), "ab") as f, flock(f):
+            # Drop the tail of a write that was interrupted part way.
+            size = os.fstat(f.fileno()).st_size
+            f.truncate(size - size % (dim * 4))
+            first = size // (dim * 4)
+
+            f.write(vectors.tobytes())
+            f.flush()
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, key, row) "
+                "VALUES (?, ?, ?)",
+                [(model, key, first + i) for i, key in enumerate(new)],
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "memory_entries": len(self._memory)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._maps.clear()
+            self._dims.clear()
+
+        if self.path:
+            conn = self._connection()
+            for (model,) in conn.execute("SELECT model FROM models").fetchall():
+                if os.path.exists(self._file(model)):
+                    os.remove(self._file(model))
+            conn.execute("DELETE FROM embeddings")
+            conn.execute("DELETE FROM models")
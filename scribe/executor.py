@@ -0,0 +1,109 @@
+from typing import Any, Callable, Dict, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
+import threading
+
+T = TypeVar("T")
+
+DEFAULT_CONCURRENCY = 1
+DEFAULT_QUEUE_DEPTH = 16
+
+
+class Overloaded(Exception):
+    """
+    Raised when a model's queue is full and the call was rejected.
+    """
+
+
+class ModelLimiter:
+    """
+    Runs blocking inference for one model in its own thread pool, off the
+    event loop.
+
+    At most `concurrency` calls run at once and at most `queue_depth` more
+    wait for a slot. Calls beyond that fail fast with `Overloaded` instead of
+    queueing without bound. Threads are enough here: torch releases the GIL
+    while it runs its kernels.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_depth: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix=f"scribe-{name}"
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self._pending >= self.concurrency + self.queue_depth:
+            self.rejected += 1
+            raise Overloaded(f"Too many pending requests for '{self.name}'")
+
+        # The semaphore belongs to one event loop, make a new one when the
+        # limiter is used from another (e.g. a later `asyncio.run`).
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "concurrency": self.concurrency,
+            "queue_depth": self.queue_depth,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def limiter(name: str) -> ModelLimiter:
+    """
+    The limiter for model `name`, configured from `SCRIBE_<NAME>_CONCURRENCY`
+    and `SCRIBE_<NAME>_QUEUE_DEPTH`.
+    """
+    try:
+        return _limiters[name]
+    except KeyError:
+        pass
+
+    with _lock:
+        if name not in _limiters:
+            prefix = f"SCRIBE_{name.upper()}"
+            _limiters[name] = ModelLimiter(
+                name,
+                concurrency=max(
+                    1, _env_int(f"{prefix}_CONCURRENCY", DEFAULT_CONCURRENCY)
+                ),
+                queue_depth=max(
+                    0, _env_int(f"{prefix}_QUEUE_DEPTH", DEFAULT_QUEUE_DEPTH)
+                ),
+            )
+        return _limiters[name]
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {name: item.stats() for name, item in list(_limiters.items())}
@@ -1,7 +1,7 @@
-from typing import Optional
-from transformers import pipeline
+from typing import Any, Iterator, List, Tuple
 from difflib import unified_diff
-from .utils import smart_split
+from .models import GRAMMAR_MODEL, ModelRegistry, registry as default_registry
+from .utils import fast_split, iter_split, smart_join
 
 import warnings
 
@@ -9,32 +9,100 @@ warnings.filterwarnings("ignore")
 
 
 class GrammarCorrector:
-    def __init__(self):
-        self.model_name = "pszemraj/flan-t5-large-grammar-synthesis"
-        self.corrector = pipeline("text2text-generation", self.model_name)
+    def __init__(self, registry: ModelRegistry = default_registry):
+        self.model_name = GRAMMAR_MODEL
+        self.registry = registry
 
-        self.result = None
+    @property
+    def corrector(self):
+        return self.registry.get("grammar")
 
-    def correct(self, text: str, max_chunk_size: int = 100) -> str:
+    @property
+    def tokenizer(self):
+        return self.corrector.tokenizer
+
+    def correct(
+        self, text: str, max_chunk_size: int = 100, batch_size: int = 8
+    ) -> str:
         """
         Corrects the grammar of the input text.
 
         Parameters
         ----------
         text: The text whose grammar is to be corrected.
+        max_chunk_size: Maximum number of model tokens sent at once.
+        batch_size: Number of chunks corrected in one generate call.
+
+        """
+        chunks, paragraph_ids = fast_split(text, max_chunk_size, self.tokenizer)
+        corrected_texts = self._correct_chunks(chunks, batch_size)
+
+        return smart_join(corrected_texts, paragraph_ids)
 
+    def iter_correct(
+        self, text: str, max_chunk_size: int = 100, batch_size: int = 8
+    ) -> Iterator[Tuple[int, str]]:
         """
-        split_texts = smart_split(text, max_chunk_size)
-        corrected_texts = [
-            self.corrector(chunk)[0]["generated_text"] for chunk in split_texts
-        ]
+        Corrects the text incrementally, yielding `(paragraph_id, corrected_chunk)`
+        in document order as soon as each batch is done. The corrected
+        document can be rebuilt with `smart_join`.
+        """
+        _check_batch_size(batch_size)
+        chunks: List[str] = []
+        paragraph_ids: List[int] = []
+        pending = 0
+
+        for chunk, para_id in iter_split(text, max_chunk_size, self.tokenizer):
+            if not chunk.strip() and not chunks:
+                yield para_id, ""
+                continue
+
+            chunks.append(chunk)
+            paragraph_ids.append(para_id)
+            pending += bool(chunk.strip())
+
+            if pending >= batch_size:
+                corrected = self._correct_chunks(chunks, batch_size)
+                yield from zip(paragraph_ids, corrected)
+                chunks, paragraph_ids, pending = [], [], 0
+
+        if chunks:
+            yield from zip(paragraph_ids, self._correct_chunks(chunks, batch_size))
+
+    def _correct_chunks(self, chunks: List[str], batch_size: int) -> List[str]:
+        _check_batch_size(batch_size)
+        # Empty-line chunks never reach the model.
+        corrected = ["" for _ in chunks]
+        order = [i for i, chunk in enumerate(chunks) if chunk.strip()]
+        if not order:
+            return corrected
+
+        # Sort by length so every batch is padded to a similar length, then
+        # put the corrections back in document order.
+        order.sort(key=lambda i: len(chunks[i]))
+
+        with self.registry.use("grammar") as corrector:
+            outputs = corrector([chunks[i] for i in order], batch_size=batch_size)
+
+        for i, output in zip(order, outputs):
+            corrected[i] = _generated_text(output)
+
+        return corrected
+
+    def diff(self, original: str, corrected: str) -> str:
+        return diff(original, corrected)
+
 
-        self.result = " ".join(corrected_texts)
+def _check_batch_size(batch_size: int) -> None:
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, got {batch_size}")
 
-        return self.result
 
-    def diff(self, original: str, corrected: Optional[str] = None) -> str:
-        return diff(original, corrected if corrected is not None else self.result)
+def _generated_text(output: Any) -> str:
+    # Pipelines return either a dict or a one-element list of dicts per input.
+    if isinstance(output, list):
+        output = output[0]
+    return output["generated_text"]
 
 
 def diff(original: str, corrected: str) -> str:
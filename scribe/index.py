@@ -0,0 +1,638 @@
+from typing import Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import json
+import os
+import threading
+
+import numpy as np
+
+from .quantization import (
+    STORAGES,
+    hamming_scores,
+    int8_scores,
+    quantize_binary,
+    quantize_int8,
+)
+from .storage import lock_file, read_manifest, write_manifest
+
+# Rows scored at once by the exact search and the k-means assignment, so
+# memory stays bounded on large corpora.
+BLOCK_SIZE = 65536
+
+
+class VectorIndex:
+    """
+    A persistent index of embeddings for nearest neighbour search, e.g. of
+    SBERT embeddings of every paragraph submitted by a cohort.
+
+    Vectors are L2-normalised when added, so scores are cosine similarities.
+    `search` either scans every vector exactly, in blocks, or, once `train`
+    has clustered the corpus with k-means, only scans the `n_probe` clusters
+    closest to the query (an inverted file, IVF).
+
+    When `path` is set the index lives in that directory: `add` appends to
+    raw float32 files that are read through memory maps, and a manifest
+    written last records how many rows are complete. Pre-forked workers can
+    share the directory, writers take a file lock and readers pick up other
+    workers' changes with `refresh`.
+
+    `storage` picks what `search` scans: the float32 vectors, int8 codes
+    with a scale per vector (4× smaller) or sign bits (32× smaller) compared
+    by Hamming distance. On disk the float32 vectors are kept next to the
+    codes, but stay out of memory unless `search` is asked to `rescore`
+    its candidates with them. In memory they are dropped, unless
+    `keep_vectors` is set to allow rescoring.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        storage: Optional[str] = None,
+        keep_vectors: bool = False,
+    ):
+        if storage is not None and storage not in STORAGES:
+            raise ValueError(f"Unknown storage '{storage}', expected one of {STORAGES}")
+
+        self.path = path
+        self.storage = storage or "float32"
+        self.keep_vectors = keep_vectors
+
+        self.ids: List[str] = []
+        self.dim: Optional[int] = None
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+
+        self._order: Optional[np.ndarray] = None
+        self._bounds: Optional[np.ndarray] = None
+        self._version = 0
+        self._ids_bytes = 0
+        self._lock = threading.RLock()
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            self.refresh()
+        if storage is not None and storage != self.storage:
+            self.quantize(storage)
+
+    @classmethod
+    def from_env(cls) -> "VectorIndex":
+        """
+        The index stored in `SCRIBE_INDEX`, or an in-memory one when unset,
+        with the storage from `SCRIBE_INDEX_STORAGE`. An in-memory quantized
+        index keeps its float32 vectors for rescoring when
+        `SCRIBE_INDEX_KEEP_VECTORS` is set.
+        """
+        keep = os.environ.get("SCRIBE_INDEX_KEEP_VECTORS", "")
+        return cls(
+            os.environ.get("SCRIBE_INDEX") or None,
+            storage=os.environ.get("SCRIBE_INDEX_STORAGE") or None,
+            keep_vectors=keep.lower() in ("1", "true", "yes"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def has_vectors(self) -> bool:
+        """
+        Whether the float32 vectors are available, for `rescore`.
+        """
+        return len(self.vectors) == len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes of the arrays held in memory. Memory-mapped files are not
+        counted, the OS pages them in and out.
+        """
+        arrays = [
+            self.vectors,
+            self.codes,
+            self.scales,
+            self.centroids,
+            self.assignments,
+            self._order,
+            self._bounds,
+        ]
+        return sum(
+            array.nbytes
+            for array in arrays
+            if array is not None and not isinstance(array, np.memmap)
+        )
+
+    def _file(self, name: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Hold the index lock, across threads and, for an index on disk,
+        across processes.
+        """
+        with self._lock:
+            if not self.path:
+                yield
+                return
+
+            with lock_file(self._file(".lock")):
+                yield
+
+    def _manifest(self) -> dict:
+        return read_manifest(
+            self._file("manifest.json"),
+            {
+                "version": 0,
+                "dim": None,
+                "count": 0,
+                "ids_bytes": 0,
+                "storage": self.storage,
+            },
+        )
+
+    def _write_manifest(self, manifest: dict) -> None:
+        write_manifest(self._file("manifest.json"), manifest)
+
+    def refresh(self) -> bool:
+        """
+        Reload the index from disk if another writer changed it. Returns
+        whether anything was reloaded.
+        """
+        if not self.path:
+            return False
+
+        with self._lock:
+            manifest = self._manifest()
+            if manifest["version"] == self._version:
+                return False
+
+            self._load(manifest)
+            return True
+
+    def _load(self, manifest: dict) -> None:
+        # `ids.jsonl` is append-only, so only the ids written since the last
+        # load are read. The memory maps are cheap to open again.
+        dim, count = manifest["dim"], manifest["count"]
+        self.dim = dim
+
+        if manifest["ids_bytes"] < self._ids_bytes:
+            self.ids, self._ids_bytes = [], 0
+        if manifest["ids_bytes"] > self._ids_bytes:
+            with open(self._file("ids.jsonl"), "rb") as f:
+                f.seek(self._ids_bytes)
+                lines = f.read(manifest["ids_bytes"] - self._ids_bytes).splitlines()
+            self.ids.extend(json.loads(line) for line in lines)
+            self._ids_bytes = manifest["ids_bytes"]
+
+        self.storage = manifest.get("storage", "float32")
+        self.codes = self.scales = None
+        if not count:
+            self.vectors = np.empty((0, dim or 0), dtype=np.float32)
+            self.centroids = self.assignments = None
+            self._build_lists()
+            self._version = manifest["version"]
+            return
+
+        self.vectors = _memmap(self._file("vectors.f32"), np.float32, (count, dim))
+        if self.storage == "int8":
+            self.codes = _memmap(self._file("codes.i8"), np.int8, (count, dim))
+            self.scales = _memmap(self._file("scales.f32"), np.float32, (count,))
+        elif self.storage == "binary":
+            self.codes = _memmap(
+                self._file("codes.bin"), np.uint8, (count, (dim + 7) // 8)
+            )
+
+        if manifest.get("n_lists"):
+            self.centroids = np.load(self._file("centroids.npy"))
+            self.assignments = _memmap(self._file("lists.i32"), np.int32, (count,))
+        else:
+            self.centroids = self.assignments = None
+
+        self._build_lists()
+        self._version = manifest["version"]
+
+    def add(self, ids: List[str], vectors: np.ndarray) -> None:
+        """
+        Add `vectors`, one row per id. On a trained index the new vectors
+        join their closest cluster, the clusters themselves are only
+        recomputed by `train`.
+        """
+        vectors = _normalize(vectors)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        if not len(ids):
+            return
+
+        with self.locked():
+            self.refresh()
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"Index holds {self.dim} dimensional vectors, "
+                    f"got {vectors.shape[1]}"
+                )
+
+            assignments = _assign(vectors, self.centroids) if self.trained else None
+            codes, scales = _encode(vectors, self.storage)
+
+            if not self.path:
+                self.dim = vectors.shape[1]
+                self.ids.extend(ids)
+                if self.storage == "float32" or self.keep_vectors:
+                    self.vectors = _extend(self.vectors, vectors)
+                self.codes = _extend(self.codes, codes)
+                self.scales = _extend(self.scales, scales)
+                self.assignments = _extend(self.assignments, assignments)
+                self._build_lists()
+                return
+
+            count = len(self.ids)
+            dim = vectors.shape[1]
+            # Appends past the manifest are left by interrupted writes.
+            _append(self._file("vectors.f32"), count * dim * 4, vectors.tobytes())
+            data = "".join(json.dumps(i) + "\n" for i in ids).encode("utf-8")
+            _append(self._file("ids.jsonl"), self._ids_bytes, data)
+            if assignments is not None:
+                _append(self._file("lists.i32"), count * 4, assignments.tobytes())
+            if codes is not None:
+                name = _CODES_FILES[self.storage]
+                _append(self._file(name), count * codes.shape[1], codes.tobytes())
+            if scales is not None:
+                _append(self._file("scales.f32"), count * 4, scales.tobytes())
+
+            manifest = self._manifest()
+            manifest.update(
+                version=self._version + 1,
+                dim=dim,
+                count=count + len(ids),
+                ids_bytes=self._ids_bytes + len(data),
+                storage=self.storage,
+            )
+            self._write_manifest(manifest)
+            self._load(manifest)
+
+    def quantize(self, storage: str) -> None:
+        """
+        Switch the index to `storage`, re-encoding the stored vectors. An
+        in-memory index that dropped its float32 vectors is re-encoded from
+        its current codes, which loses more precision.
+        """
+        if storage not in STORAGES:
+            raise ValueError(f"Unknown storage '{storage}', expected one of {STORAGES}")
+
+        with self.locked():
+            self.refresh()
+            if storage == self.storage:
+                return
+
+            # Vectors decoded from the codes are kept if they are needed.
+            decode = not self.path and not self.has_vectors
+            blocks, codes, scales = [], [], []
+            for start in range(0, len(self.ids), BLOCK_SIZE):
+                block = self._float_rows(slice(start, start + BLOCK_SIZE))
+                block_codes, block_scales = _encode(block, storage)
+                if decode:
+                    blocks.append(block)
+                codes.append(block_codes)
+                scales.append(block_scales)
+
+            if not self.path:
+                if storage == "float32" or self.keep_vectors:
+                    if not self.has_vectors:
+                        self.vectors = _concatenate(blocks)
+                else:
+                    self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+                self.storage = storage
+                self.codes = _concatenate(codes) if storage != "float32" else None
+                self.scales = _concatenate(scales) if storage == "int8" else None
+                return
+
+            if storage != "float32":
+                _replace(self._file(_CODES_FILES[storage]), codes)
+            if storage == "int8":
+                _replace(self._file("scales.f32"), scales)
+
+            manifest = self._manifest()
+            manifest.update(version=self._version + 1, storage=storage)
+            self._write_manifest(manifest)
+            self._load(manifest)
+
+    def train(
+        self,
+        n_lists: Optional[int] = None,
+        iterations: int = 10,
+        sample_size: Optional[int] = None,
+        seed: int = 0,
+    ) -> None:
+        """
+        Cluster the vectors into `n_lists` lists (by default about 4·√N)
+        with spherical k-means, for approximate search. Centroids are fitted
+        on `sample_size` random vectors (by default 256 per list), then
+        every vector is assigned to its closest centroid.
+        """
+        with self.locked():
+            self.refresh()
+            count = len(self.ids)
+            if not count:
+                raise ValueError("Cannot train an empty index")
+
+            n_lists = min(count, n_lists or max(1, int(4 * np.sqrt(count))))
+            sample_size = min(count, sample_size or 256 * n_lists)
+
+            rng = np.random.default_rng(seed)
+            sample = self._float_rows(
+                np.sort(rng.choice(count, sample_size, replace=False))
+            )
+            centroids = _kmeans(sample, n_lists, iterations, rng)
+            assignments = np.concatenate(
+                [
+                    _assign(self._float_rows(slice(start, stop)), centroids)
+                    for start, stop in _blocks(count)
+                ]
+            )
+
+            if not self.path:
+                self.centroids, self.assignments = centroids, assignments
+                self._build_lists()
+                return
+
+            np.save(self._file("centroids.npy.tmp.npy"), centroids)
+            os.replace(self._file("centroids.npy.tmp.npy"), self._file("centroids.npy"))
+            _replace(self._file("lists.i32"), [assignments])
+
+            manifest = self._manifest()
+            manifest.update(version=self._version + 1, n_lists=n_lists)
+            self._write_manifest(manifest)
+            self._load(manifest)
+
+    def _build_lists(self) -> None:
+        # Row numbers grouped by list: list c is _order[_bounds[c]:_bounds[c + 1]].
+        if self.centroids is None or self.assignments is None:
+            self._order = self._bounds = None
+            return
+
+        self._order = np.argsort(self.assignments, kind="stable")
+        self._bounds = np.searchsorted(
+            self.assignments[self._order], np.arange(len(self.centroids) + 1)
+        )
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        n_probe: Optional[int] = None,
+        rescore: Optional[int] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        The `top_k` (id, score) pairs closest to each query, best first.
+
+        With `n_probe` set on a trained index, only the vectors of the
+        `n_probe` closest lists are scanned. Otherwise every vector is.
+
+        On a quantized index, `rescore` keeps that many candidates from the
+        scan and reranks them with their float32 vectors, so the scores
+        returned are exact cosine similarities.
+        """
+        queries = _normalize(queries)
+
+        with self._lock:
+            if not len(self.ids) or top_k <= 0:
+                return [[] for _ in queries]
+
+            rescore = rescore if self.storage != "float32" else None
+            if rescore and not self.has_vectors:
+                raise ValueError(
+                    "Rescoring needs the float32 vectors, "
+                    "create the index with keep_vectors=True"
+                )
+            candidates = max(top_k, rescore or 0)
+
+            if n_probe and self.trained:
+                rows, scores = self._search_lists(queries, candidates, n_probe)
+            else:
+                rows, scores = self._search_exact(queries, candidates)
+
+            if rescore:
+                rows, scores = self._rescore(queries, rows, top_k)
+
+            return [
+                [(self.ids[r], float(s)) for r, s in zip(row, score)]
+                for row, score in zip(rows, scores)
+            ]
+
+    def _search_exact(
+        self, queries: np.ndarray, top_k: int
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        encoded = self._encode_queries(queries)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, len(self.ids), BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, len(self.ids))
+            block_scores = self._score(queries, encoded, slice(start, stop))
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            rows = np.concatenate(
+                [
+                    best_rows,
+                    np.broadcast_to(
+                        np.arange(start, stop), (len(queries), stop - start)
+                    ),
+                ],
+                axis=1,
+            )
+            top = _top_k(scores, top_k)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+
+        return list(best_rows), list(best_scores)
+
+    def _search_lists(
+        self, queries: np.ndarray, top_k: int, n_probe: int
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        assert self.centroids is not None
+        assert self._order is not None and self._bounds is not None
+
+        encoded = self._encode_queries(queries)
+        probes = _top_k(queries @ self.centroids.T, n_probe)
+        all_rows, all_scores = [], []
+
+        for i, probe in enumerate(probes):
+            candidates = np.concatenate(
+                [self._order[self._bounds[c] : self._bounds[c + 1]] for c in probe]
+            )
+            candidates.sort()
+            scores = self._score(queries[i : i + 1], encoded[i : i + 1], candidates)
+            top = _top_k(scores, top_k)[0]
+            all_rows.append(candidates[top])
+            all_scores.append(scores[0, top])
+
+        return all_rows, all_scores
+
+    def _rescore(
+        self, queries: np.ndarray, rows: List[np.ndarray], top_k: int
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        all_rows, all_scores = [], []
+
+        for query, candidates in zip(queries, rows):
+            candidates = np.sort(candidates)
+            scores = np.asarray(self.vectors[candidates]) @ query
+            top = _top_k(scores[None, :], top_k)[0]
+            all_rows.append(candidates[top])
+            all_scores.append(scores[top])
+
+        return all_rows, all_scores
+
+    def _float_rows(self, rows) -> np.ndarray:
+        """
+        Float32 vectors of `rows`, decoded from the codes when the index
+        does not keep the vectors themselves.
+        """
+        if self.has_vectors:
+            return np.asarray(self.vectors[rows])
+        assert self.codes is not None and self.dim is not None
+        codes = np.asarray(self.codes[rows])
+        if self.storage == "int8":
+            assert self.scales is not None
+            return _normalize(codes * np.asarray(self.scales[rows])[:, None])
+        signs = np.unpackbits(codes, axis=1, count=self.dim).astype(np.float32)
+        return _normalize(2 * signs - 1)
+
+    def _encode_queries(self, queries: np.ndarray) -> np.ndarray:
+        # Binary codes are compared with binary queries, int8 codes with
+        # the float queries.
+        if self.storage == "binary":
+            return quantize_binary(queries)
+        return queries
+
+    def _score(self, queries: np.ndarray, encoded: np.ndarray, rows) -> np.ndarray:
+        """
+        Scores of `queries` against the stored `rows` (a slice or an array
+        of row numbers), one row per query.
+        """
+        if self.storage == "int8":
+            assert self.codes is not None and self.scales is not None
+            return int8_scores(
+                queries, np.asarray(self.codes[rows]), np.asarray(self.scales[rows])
+            )
+        if self.storage == "binary":
+            assert self.codes is not None and self.dim is not None
+            return hamming_scores(encoded, np.asarray(self.codes[rows]), self.dim)
+        return queries @ np.asarray(self.vectors[rows]).T
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors / np.maximum(norms, 1e-12))
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Column indices of the `k` highest scores of each row, best first.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((len(scores), 0), dtype=np.int64)
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_SIZE):
+        block = np.asarray(vectors[start : start + BLOCK_SIZE])
+        assignments[start : start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return assignments
+
+
+def _kmeans(
+    vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        clusters, starts = np.unique(assignments[order], return_index=True)
+        centroids[clusters] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        # Restart empty clusters from random vectors.
+        empty = np.setdiff1d(np.arange(k), clusters)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty))]
+
+        centroids = _normalize(centroids)
+
+    return centroids
+
+
+_CODES_FILES = {"int8": "codes.i8", "binary": "codes.bin"}
+
+
+def _encode(
+    vectors: np.ndarray, storage: str
+) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    # The codes and, for int8, the scales stored for `vectors`. The scales
+    # make every decoded vector unit length, so int8 scores are cosine
+    # similarities and never exceed 1.
+    if storage == "int8":
+        codes, _ = quantize_int8(vectors)
+        norms = np.linalg.norm(codes.astype(np.float32), axis=1)
+        return codes, (1 / np.maximum(norms, 1e-12)).astype(np.float32)
+    if storage == "binary":
+        return quantize_binary(vectors), None
+    return None, None
+
+
+def _extend(
+    array: Optional[np.ndarray], rows: Optional[np.ndarray]
+) -> Optional[np.ndarray]:
+    if array is None or not len(array):
+        return rows
+    if rows is None:
+        return array
+    return np.concatenate([array, rows])
+
+
+def _blocks(count: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, count, BLOCK_SIZE):
+        yield start, min(start + BLOCK_SIZE, count)
+
+
+def _concatenate(blocks: List[np.ndarray]) -> Optional[np.ndarray]:
+    return np.concatenate(blocks) if blocks else None
+
+
+def _replace(path: str, blocks: List[np.ndarray]) -> None:
+    """
+    Atomically replace the file at `path` with the bytes of `blocks`.
+    """
+    with open(path + ".tmp", "wb") as f:
+        for block in blocks:
+            f.write(np.ascontiguousarray(block).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def _memmap(path: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _append(path: str, size: int, data: bytes) -> None:
+    """
+    Write `data` to `path` at offset `size`, dropping anything past it.
+    """
+    with open(path, "ab") as f:
+        f.truncate(size)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
@@ -1,10 +1,57 @@
-from typing import List, Optional, Literal, Any, Union
-from .ollama import OllamaLLM
-from .gemini import GeminiLLM
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
+from concurrent.futures import ThreadPoolExecutor
+from ..utils import pack_chunks
+from .cache import ResponseCache
+import asyncio
+import importlib
 import os
 
+if TYPE_CHECKING:
+    from .ollama import OllamaLLM
+    from .gemini import GeminiLLM
+
 __all__ = ["LLM", "OllamaLLM", "GeminiLLM"]
 
+# The provider SDKs are only imported when their class is first used.
+_LAZY_IMPORTS = {
+    "OllamaLLM": ".ollama",
+    "GeminiLLM": ".gemini",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def _reduce_blocks(
+    partials: List[str], blocks: List[str], chunk_size: int
+) -> List[str]:
+    """
+    Pack the partial summaries of `blocks` into the blocks of the next
+    reduce pass. Returns a single block once they all fit in one, or when
+    packing stops shrinking the input (e.g. the summaries are as long as
+    their blocks), so the reduction always terminates.
+    """
+    merged = pack_chunks("\n\n".join(partials), chunk_size)
+    if len(merged) >= len(blocks):
+        return ["\n\n".join(partials)]
+    return merged
+
 
 class LLM:
     def __init__(
@@ -12,13 +59,24 @@ class LLM:
         provider: Literal["gemini", "ollama"] = "gemini",
         gemini_api_key: Optional[str] = os.environ.get("GEMINI_API_KEY"),
         ollama_default_model: str = "gemma3:1b",
+        cache: Optional[ResponseCache] = None,
     ):
         self.provider = provider
+        # Opt-in: responses are only cached when a cache is given or
+        # SCRIBE_LLM_CACHE points at a database.
+        self.cache = cache if cache is not None else ResponseCache.from_env()
 
+        self.llm: Union["GeminiLLM", "OllamaLLM"]
         if provider == "gemini":
-            self.llm = GeminiLLM(api_key=gemini_api_key)
+            from .gemini import GeminiLLM
+
+            self.llm = GeminiLLM(api_key=gemini_api_key, cache=self.cache)
         else:
-            self.llm = OllamaLLM(default_model=ollama_default_model)
+            from .ollama import OllamaLLM
+
+            self.llm = OllamaLLM(
+                default_model=ollama_default_model, cache=self.cache
+            )
 
     def _generate_content(
         self,
@@ -52,22 +110,75 @@ class LLM:
                 **kwargs,
             )
 
-    def summarize(
+    async def _agenerate_content(
         self,
         input_text: str,
-        max_tokens: int = 100,
-        temperature: float = 0.3,
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
         additional_instructions: Optional[List[str]] = None,
         language: Optional[str] = None,
-    ) -> str:
-        return self.llm.summarize(
+        **kwargs,
+    ) -> Union[str, Any]:
+        """
+        Async version of `_generate_content`.
+        """
+        response = await self.llm._agenerate_content(
             input_text=input_text,
+            system_instruction=system_instruction,
             max_tokens=max_tokens,
             temperature=temperature,
             additional_instructions=additional_instructions,
             language=language,
+            **kwargs,
         )
 
+        if self.provider == "gemini":
+            return response.text.strip()
+        return response
+
+    def summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        map_reduce: bool = False,
+        chunk_size: int = 2048,
+        fan_out: int = 4,
+    ) -> str:
+        """
+        Summarize `input_text`.
+
+        With `map_reduce`, the text is split into blocks of at most
+        `chunk_size` words, up to `fan_out` blocks are summarized at once,
+        and the partial summaries are merged by further summarization passes
+        until they fit in a single block.
+        """
+        if fan_out < 1:
+            raise ValueError(f"fan_out must be at least 1, got {fan_out}")
+
+        def summarize(text: str) -> str:
+            return self.llm.summarize(
+                input_text=text,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                additional_instructions=additional_instructions,
+                language=language,
+            )
+
+        if not map_reduce:
+            return summarize(input_text)
+
+        blocks = pack_chunks(input_text, chunk_size)
+        with ThreadPoolExecutor(max_workers=fan_out) as executor:
+            while len(blocks) > 1:
+                partials = list(executor.map(summarize, blocks))
+                blocks = _reduce_blocks(partials, blocks, chunk_size)
+
+        return summarize(blocks[0] if blocks else input_text)
+
     def answer_question(
         self,
         question: str,
@@ -75,6 +186,7 @@ class LLM:
         max_tokens: int = 256,
         temperature: float = 0.3,
         language: Optional[str] = None,
+        top_k: Optional[int] = 4,
     ) -> str:
         return self.llm.answer_question(
             question=question,
@@ -82,6 +194,7 @@ class LLM:
             max_tokens=max_tokens,
             temperature=temperature,
             language=language,
+            top_k=top_k,
         )
 
     def grammar_corrector(
@@ -99,3 +212,182 @@ class LLM:
             additional_instructions=additional_instructions,
             language=language,
         )
+
+    async def asummarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        map_reduce: bool = False,
+        chunk_size: int = 2048,
+        fan_out: int = 4,
+    ) -> str:
+        """
+        Async version of `summarize`.
+        """
+        if fan_out < 1:
+            raise ValueError(f"fan_out must be at least 1, got {fan_out}")
+
+        async def summarize(text: str) -> str:
+            return await self.llm.asummarize(
+                input_text=text,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                additional_instructions=additional_instructions,
+                language=language,
+            )
+
+        if not map_reduce:
+            return await summarize(input_text)
+
+        semaphore = asyncio.Semaphore(fan_out)
+
+        async def summarize_block(text: str) -> str:
+            async with semaphore:
+                return await summarize(text)
+
+        blocks = pack_chunks(input_text, chunk_size)
+        while len(blocks) > 1:
+            partials = await asyncio.gather(*(summarize_block(b) for b in blocks))
+            blocks = _reduce_blocks(list(partials), blocks, chunk_size)
+
+        return await summarize(blocks[0] if blocks else input_text)
+
+    async def aanswer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 256,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> str:
+        return await self.llm.aanswer_question(
+            question=question,
+            context=context,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            language=language,
+            top_k=top_k,
+        )
+
+    async def agrammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 512,
+        temperature: float = 0.1,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> str:
+        return await self.llm.agrammar_corrector(
+            text=text,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=additional_instructions,
+            language=language,
+        )
+
+    def stream_summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[str]:
+        yield from self.llm.stream_summarize(
+            input_text=input_text,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=additional_instructions,
+            language=language,
+        )
+
+    def stream_answer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 256,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> Iterator[str]:
+        yield from self.llm.stream_answer_question(
+            question=question,
+            context=context,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            language=language,
+            top_k=top_k,
+        )
+
+    def stream_grammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 512,
+        temperature: float = 0.1,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[str]:
+        yield from self.llm.stream_grammar_corrector(
+            text=text,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=additional_instructions,
+            language=language,
+        )
+
+    async def astream_summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream_summarize(
+            input_text=input_text,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=additional_instructions,
+            language=language,
+        ):
+            yield chunk
+
+    async def astream_answer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 256,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream_answer_question(
+            question=question,
+            context=context,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            language=language,
+            top_k=top_k,
+        ):
+            yield chunk
+
+    async def astream_grammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 512,
+        temperature: float = 0.1,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream_grammar_corrector(
+            text=text,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=additional_instructions,
+            language=language,
+        ):
+            yield chunk
@@ -0,0 +1,267 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CachedResponse:
+    """
+    Stands in for a provider response object served from the cache.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses: an in-process LRU of `memory_size`
+    entries in front of a SQLite database at `path`.
+
+    The database runs in WAL mode, so every worker process on a host can share
+    one file. Entries expire after `ttl` seconds, and the least recently used
+    ones are evicted once the stored responses exceed `max_bytes`. Hit and
+    miss counters are kept in the database too, so `stats` covers every
+    process using it.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        created REAL NOT NULL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    """
+
+    # Counters are flushed to the database every this many lookups.
+    _FLUSH_EVERY = 64
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_bytes: int = 512 * 1024 * 1024,
+        memory_size: int = 1024,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_size = memory_size
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lookups = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.executescript(self._SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """
+        The cache configured by `SCRIBE_LLM_CACHE` (database path),
+        `SCRIBE_LLM_CACHE_TTL` (seconds) and `SCRIBE_LLM_CACHE_MAX_MB`, or
+        None when caching is not enabled.
+        """
+        path = os.environ.get("SCRIBE_LLM_CACHE")
+        if not path:
+            return None
+
+        ttl = os.environ.get("SCRIBE_LLM_CACHE_TTL")
+        max_mb = os.environ.get("SCRIBE_LLM_CACHE_MAX_MB")
+        return cls(
+            path,
+            ttl=float(ttl) if ttl else 7 * 24 * 3600,
+            max_bytes=int(float(max_mb or 512) * 1024 * 1024),
+        )
+
+    @staticmethod
+    def key(
+        provider: str,
+        model: str,
+        system_instruction: str,
+        input_text: Any,
+        additional_instructions: Optional[List[str]],
+        language: Optional[str],
+        temperature: float,
+        response_schema: Optional[Any] = None,
+        response_format: Optional[Any] = None,
+    ) -> str:
+        """
+        Hash of everything that determines a response.
+        """
+        parts = [
+            provider,
+            model,
+            system_instruction,
+            input_text,
+            additional_instructions,
+            language,
+            temperature,
+            _schema_key(response_schema),
+            response_format,
+        ]
+        payload = json.dumps(parts, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self._count("memory_hits")
+                return entry[0]
+            self._memory.pop(key, None)
+
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or self._expired(row[1], now):
+            if row is not None:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            with self._lock:
+                self._count("misses")
+            return None
+
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self._remember(key, row[0], row[1])
+            self._count("disk_hits")
+        return row[0]
+
+    async def aget(self, key: str) -> Optional[str]:
+        """
+        Async version of `get`, the SQLite lookup runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        """
+        Async version of `set`, the SQLite write runs in a worker thread.
+        """
+        await asyncio.to_thread(self.set, key, value)
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, value, now, now, len(value.encode("utf-8"))),
+        )
+
+        with self._lock:
+            self._remember(key, value, now)
+            self._writes += 1
+            evict = self._writes % 32 == 0
+
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Drop expired entries, then the least recently used ones until the
+        stored responses fit in `max_bytes`.
+        """
+        conn = self._connection()
+        if self.ttl is not None:
+            conn.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+            )
+
+        (total,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        freed = 0
+        keys = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ):
+            if freed >= excess:
+                break
+            keys.append((key,))
+            freed += size
+
+        conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        # Called with self._lock held.
+        self._counters[name] = self._counters.get(name, 0) + 1
+        self._lookups += 1
+        if self._lookups % self._FLUSH_EVERY == 0:
+            self._flush()
+
+    def _flush(self) -> None:
+        counters, self._counters = self._counters, {}
+        self._connection().executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(counters.items()),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counters shared by every process using this database.
+        """
+        with self._lock:
+            self._flush()
+
+        conn = self._connection()
+        stats = {name: 0 for name in ("memory_hits", "disk_hits", "misses")}
+        stats.update(dict(conn.execute("SELECT name, value FROM counters")))
+        (stats["entries"],) = conn.execute(
+            "SELECT COUNT(*) FROM responses"
+        ).fetchone()
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        self._connection().execute("DELETE FROM responses")
+
+
+def _schema_key(schema: Optional[Any]) -> Optional[str]:
+    if schema is None:
+        return None
+    name = getattr(schema, "__qualname__", type(schema).__name__)
+    return f"{name}:{getattr(schema, '__annotations__', schema)!r}"
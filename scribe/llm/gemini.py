@@ -1,23 +1,99 @@
-from typing import List, Optional, Any, Union
+from typing import AsyncIterator, Iterator, List, Optional, Any, Tuple, Union
 import google.generativeai as genai
 import os
 
+from ..retrieval import retriever
+from .cache import CachedResponse, ResponseCache
+
+
+SUMMARY_INSTRUCTION = (
+    "You are an AI Assistant, Your only job is to provide summary for the text given, you should give no hints that you are an AI. Do not say that is a summary, just output it. "
+    "You do not explain the document/text, you just output the summary."
+    "and do not ever interact with the user. For example:\n Text: [very long text]\n[Summary]\n"
+    # "Can you provide a comprehensive summary of the given text? The "
+    # "summary should cover all the key points and main ideas presented in the original text, "
+    # "while also condensing the information into a concise and easy-to-understand format. "
+    # "Please ensure that the summary includes relevant details and examples that support the main ideas, "
+    # "while avoiding any unnecessary information or repetition. "
+    "for the length and complexity of the original text, providing a clear and "
+    "accurate overview without omitting any important information. "
+    "Use bullet points and headers for clarity and to capture attention."
+    "Make sure to include headings and titles, and keep the order consistent. "
+    "Do not use markdown."
+)
+
+ANSWER_INSTRUCTION = (
+    "You are an AI assistant that answers questions. Answer the following question based only "
+    "on the context provided and nothing more. Keep the answer on point and short."
+)
+
+GRAMMAR_INSTRUCTION = (
+    "I want you to act as an expert in Language arts with advanced experience in proofreading, "
+    "editing, spelling, grammar, proper sentence structure, and punctuation. "
+    "You have critical thinking skills with the ability to analyze and evaluate information, arguments, "
+    "and ideas, and to make logical and well-supported judgments and decisions. "
+    "You will be provided content from a professional business to proofread in the form of emails, "
+    "texts, and instant messages to make sure they are error-free before sending. "
+    "Your approach would be to carefully read through each communication to identify any errors, "
+    "inconsistencies, or areas where clarity could be improved. Your overall goal is to ensure "
+    "communications are error-free, clear, and effective in achieving their intended purpose. "
+    "You will make appropriate updates to increase readability, professionalism, and cohesiveness, "
+    "while also ensuring that your intended meaning is conveyed accurately. "
+    "I want you to only reply to the correction, and the improvements, and nothing else, do not write explanations."
+    "detect the language and correct it in said language."
+)
 
 
 # Cloud inference using Gemini inference
 class GeminiLLM:
     __SUPPORTED_LANGUAGES = ["English", "Arabic", "French"]
+    __SAFETY_SETTINGS = {
+        "HATE": "BLOCK_NONE",
+        "HARASSMENT": "BLOCK_NONE",
+        "SEXUAL": "BLOCK_NONE",
+        "DANGEROUS": "BLOCK_NONE",
+    }
 
-    def __init__(self, api_key: Optional[str] = os.environ.get("GEMINI_API_KEY")):
+    def __init__(
+        self,
+        api_key: Optional[str] = os.environ.get("GEMINI_API_KEY"),
+        cache: Optional[ResponseCache] = None,
+    ):
         self.api_key = api_key
+        self.model_name = "gemini-1.5-flash"
+        self.cache = cache
         genai.configure(api_key=self.api_key)
 
     def _create_model(self, system_instruction: str) -> genai.GenerativeModel:
         return genai.GenerativeModel(
-            "gemini-1.5-flash", system_instruction=system_instruction
+            self.model_name, system_instruction=system_instruction
         )
 
-    def _generate_content(
+    def _cache_key(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        temperature: float,
+        additional_instructions: Optional[List[str]],
+        language: Optional[str],
+        response_mime_type: Optional[str],
+        response_schema: Optional[Any],
+    ) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return ResponseCache.key(
+            "gemini",
+            self.model_name,
+            system_instruction,
+            input_text,
+            additional_instructions,
+            language,
+            temperature,
+            response_schema,
+            response_mime_type,
+        )
+
+    def _prepare_request(
         self,
         input_text: Union[str, List[Any]],
         system_instruction: str,
@@ -27,9 +103,7 @@ class GeminiLLM:
         language: Optional[str] = None,
         response_mime_type: Optional[str] = None,
         response_schema: Optional[Any] = None,
-        *args,
-        **kwargs,
-    ) -> genai.types.GenerateContentResponse:
+    ) -> Tuple[genai.GenerativeModel, List[Any], genai.GenerationConfig]:
         if language and language in self.__SUPPORTED_LANGUAGES:
             system_instruction = f"[Use {language} language] " + system_instruction
 
@@ -50,19 +124,177 @@ class GeminiLLM:
         if response_schema:
             generation_config.response_schema = response_schema
 
+        return model, instructions, generation_config
+
+    def _generate_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        response_mime_type: Optional[str] = None,
+        response_schema: Optional[Any] = None,
+        *args,
+        **kwargs,
+    ) -> Union[genai.types.GenerateContentResponse, CachedResponse]:
+        key = self._cache_key(
+            input_text,
+            system_instruction,
+            temperature,
+            additional_instructions,
+            language,
+            response_mime_type,
+            response_schema,
+        )
+        if key is not None and self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return CachedResponse(cached)
+
+        model, instructions, generation_config = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+            response_mime_type,
+            response_schema,
+        )
+
         response = model.generate_content(
             instructions,
             generation_config=generation_config,
-            safety_settings={
-                "HATE": "BLOCK_NONE",
-                "HARASSMENT": "BLOCK_NONE",
-                "SEXUAL": "BLOCK_NONE",
-                "DANGEROUS": "BLOCK_NONE",
-            },
+            safety_settings=self.__SAFETY_SETTINGS,
+        )
+
+        if key is not None and self.cache is not None:
+            self.cache.set(key, response.text)
+
+        return response
+
+    async def _agenerate_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        response_mime_type: Optional[str] = None,
+        response_schema: Optional[Any] = None,
+        *args,
+        **kwargs,
+    ) -> Union[genai.types.AsyncGenerateContentResponse, CachedResponse]:
+        """
+        Async version of `_generate_content`, built on the SDK's async client.
+        """
+        key = self._cache_key(
+            input_text,
+            system_instruction,
+            temperature,
+            additional_instructions,
+            language,
+            response_mime_type,
+            response_schema,
+        )
+        if key is not None and self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                return CachedResponse(cached)
+
+        model, instructions, generation_config = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+            response_mime_type,
+            response_schema,
+        )
+
+        response = await model.generate_content_async(
+            instructions,
+            generation_config=generation_config,
+            safety_settings=self.__SAFETY_SETTINGS,
         )
 
+        if key is not None and self.cache is not None:
+            await self.cache.aset(key, response.text)
+
         return response
 
+    def _stream_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        *args,
+        **kwargs,
+    ) -> Iterator[str]:
+        """
+        Like `_generate_content`, but yields the text as it is generated.
+        """
+        model, instructions, generation_config = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+        response = model.generate_content(
+            instructions,
+            generation_config=generation_config,
+            safety_settings=self.__SAFETY_SETTINGS,
+            stream=True,
+        )
+
+        for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+
+    async def _astream_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `_stream_content`.
+        """
+        model, instructions, generation_config = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+        response = await model.generate_content_async(
+            instructions,
+            generation_config=generation_config,
+            safety_settings=self.__SAFETY_SETTINGS,
+            stream=True,
+        )
+
+        async for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+
     def summarize(
         self,
         input_text: str,
@@ -83,21 +315,7 @@ class GeminiLLM:
         temperature : float, optional
             The creativity level for the response.
         """
-        system_instruction = (
-            "You are an AI Assistant, Your only job is to provide summary for the text given, you should give no hints that you are an AI. Do not say that is a summary, just output it. "
-            "You do not explain the document/text, you just output the summary."
-            "and do not ever interact with the user. For example:\n Text: [very long text]\n[Summary]\n"
-            # "Can you provide a comprehensive summary of the given text? The "
-            # "summary should cover all the key points and main ideas presented in the original text, "
-            # "while also condensing the information into a concise and easy-to-understand format. "
-            # "Please ensure that the summary includes relevant details and examples that support the main ideas, "
-            # "while avoiding any unnecessary information or repetition. "
-            "for the length and complexity of the original text, providing a clear and "
-            "accurate overview without omitting any important information. "
-            "Use bullet points and headers for clarity and to capture attention."
-            "Make sure to include headings and titles, and keep the order consistent. "
-            "Do not use markdown."
-        )
+        system_instruction = SUMMARY_INSTRUCTION
 
         summary = self._generate_content(
             input_text,
@@ -117,13 +335,14 @@ class GeminiLLM:
         max_tokens: int = 64,
         temperature: float = 0.3,
         language: Optional[str] = None,
+        top_k: Optional[int] = 4,
     ) -> str:
         """
-        FIXME: DO NOT USE THIS FUNCTION IT DOES NOT WORK, REWRITE TO SUPPORT
-        SPLITTING IN CHUNKS.
-
         Answers a given question based on the provided context.
 
+        Long contexts are split into chunks and only the `top_k` chunks most
+        similar to the question are sent, in a single call.
+
         Parameters:
         ----------
         question : str
@@ -134,11 +353,11 @@ class GeminiLLM:
             Maximum number of tokens for the generated answer.
         temperature : float, optional
             The creativity level for the response.
+        top_k : int, optional
+            Number of context chunks to send, None sends the whole context.
         """
-        system_instruction = (
-            "You are an AI assistant that answers questions. Answer the following question based only "
-            "on the context provided and nothing more. Keep the answer on point and short."
-        )
+        system_instruction = ANSWER_INSTRUCTION
+        context = retriever.retrieve(question, context, top_k)
 
         return self._generate_content(
             f"Question:\n```{question}\n```",
@@ -169,21 +388,7 @@ class GeminiLLM:
         temperature : float, optional
             The creativity level for the response.
         """
-        system_instruction = (
-            "I want you to act as an expert in Language arts with advanced experience in proofreading, "
-            "editing, spelling, grammar, proper sentence structure, and punctuation. "
-            "You have critical thinking skills with the ability to analyze and evaluate information, arguments, "
-            "and ideas, and to make logical and well-supported judgments and decisions. "
-            "You will be provided content from a professional business to proofread in the form of emails, "
-            "texts, and instant messages to make sure they are error-free before sending. "
-            "Your approach would be to carefully read through each communication to identify any errors, "
-            "inconsistencies, or areas where clarity could be improved. Your overall goal is to ensure "
-            "communications are error-free, clear, and effective in achieving their intended purpose. "
-            "You will make appropriate updates to increase readability, professionalism, and cohesiveness, "
-            "while also ensuring that your intended meaning is conveyed accurately. "
-            "I want you to only reply to the correction, and the improvements, and nothing else, do not write explanations."
-            "detect the language and correct it in said language."
-        )
+        system_instruction = GRAMMAR_INSTRUCTION
 
         # chunks, ids = smart_split(text, max_tokens)
 
@@ -215,3 +420,198 @@ class GeminiLLM:
         ).text.strip()
 
         return corrected
+
+    async def asummarize(
+        self,
+        input_text: str,
+        max_tokens: int = 10240,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> str:
+        """
+        Async version of `summarize`.
+        """
+        response = await self._agenerate_content(
+            input_text,
+            SUMMARY_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+        return response.text
+
+    async def aanswer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 64,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> str:
+        """
+        Async version of `answer_question`.
+        """
+        context = await retriever.aretrieve(question, context, top_k)
+        response = await self._agenerate_content(
+            f"Question:\n```{question}\n```",
+            ANSWER_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions=[f"Context:\n```{context}\n```"],
+            language=language,
+        )
+
+        return response.text.strip()
+
+    async def agrammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> str:
+        """
+        Async version of `grammar_corrector`.
+        """
+        response = await self._agenerate_content(
+            text,
+            GRAMMAR_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+        return response.text.strip()
+
+    def stream_summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 10240,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming version of `summarize`, yields the summary as it is generated.
+        """
+        yield from self._stream_content(
+            input_text,
+            SUMMARY_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+    def stream_answer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 64,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> Iterator[str]:
+        """
+        Streaming version of `answer_question`.
+        """
+        context = retriever.retrieve(question, context, top_k)
+        yield from self._stream_content(
+            f"Question:\n```{question}\n```",
+            ANSWER_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions=[f"Context:\n```{context}\n```"],
+            language=language,
+        )
+
+    def stream_grammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming version of `grammar_corrector`.
+        """
+        yield from self._stream_content(
+            text,
+            GRAMMAR_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+    async def astream_summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 10240,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `stream_summarize`.
+        """
+        async for chunk in self._astream_content(
+            input_text,
+            SUMMARY_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        ):
+            yield chunk
+
+    async def astream_answer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 64,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `stream_answer_question`.
+        """
+        context = await retriever.aretrieve(question, context, top_k)
+        async for chunk in self._astream_content(
+            f"Question:\n```{question}\n```",
+            ANSWER_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions=[f"Context:\n```{context}\n```"],
+            language=language,
+        ):
+            yield chunk
+
+    async def astream_grammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `stream_grammar_corrector`.
+        """
+        async for chunk in self._astream_content(
+            text,
+            GRAMMAR_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        ):
+            yield chunk
@@ -1,15 +1,46 @@
-from typing import List, Optional, Any, Union
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Any, Union
 import ollama
-from ..utils import smart_split
+from ..retrieval import retriever
+from .cache import ResponseCache
+
+
+SUMMARY_INSTRUCTION = (
+    "You are an expert summarizer. Provide a comprehensive summary covering all key points, "
+    "using bullet points/headers when helpful."
+    "Be concise while maintaining all crucial information. "
+    "Only output the summary itself without any introductory text."
+)
+
+ANSWER_INSTRUCTION = (
+    "Answer the question strictly based on the provided context. "
+    "If unsure or if the answer isn't in the context, state that clearly. "
+    "Keep responses concise and factual."
+)
+
+GRAMMAR_INSTRUCTION = (
+    "You are a professional proofreader. Correct grammar, spelling, and punctuation errors. "
+    "Improve clarity while preserving the original meaning and tone. "
+    "Only output the corrected text without explanations."
+)
 
 
 class OllamaLLM:
     __SUPPORTED_LANGUAGES = ["English", "Arabic", "French"]
 
-    def __init__(self, default_model: str = "gemma3:1b"):
+    def __init__(
+        self, default_model: str = "gemma3:1b", cache: Optional[ResponseCache] = None
+    ):
         self.default_model = default_model
+        self.cache = cache
+        self._async_client: Optional[ollama.AsyncClient] = None
 
-    def _generate_content(
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient()
+        return self._async_client
+
+    def _prepare_request(
         self,
         input_text: Union[str, List[Any]],
         system_instruction: str,
@@ -17,9 +48,11 @@ class OllamaLLM:
         temperature: float,
         additional_instructions: Optional[List[str]] = None,
         language: Optional[str] = None,
-        response_format: Optional[str] = None,
+        response_format: Optional[Union[str, Dict[str, Any]]] = None,
         model: Optional[str] = None,
-    ) -> str:
+        response_mime_type: Optional[str] = None,
+        response_schema: Optional[Any] = None,
+    ) -> Dict[str, Any]:
         if language and language in self.__SUPPORTED_LANGUAGES:
             system_instruction = f"[Use {language} language] " + system_instruction
 
@@ -36,17 +69,179 @@ class OllamaLLM:
             "temperature": temperature,
         }
 
+        # Accept the Gemini style structured output arguments as well.
+        if not response_format and response_schema is not None:
+            from pydantic import TypeAdapter
+
+            response_format = TypeAdapter(response_schema).json_schema()
+        elif not response_format and response_mime_type == "application/json":
+            response_format = "json"
+
+        request: Dict[str, Any] = {
+            "model": model or self.default_model,
+            "messages": messages,
+            "options": options,
+        }
+
         if response_format:
-            options["format"] = response_format
+            request["format"] = response_format
+
+        return request
 
-        response = ollama.chat(
-            model=model or self.default_model,
-            messages=messages,
-            options=options,
-            stream=False,
+    def _cache_key(self, request: Dict[str, Any]) -> Optional[str]:
+        if self.cache is None:
+            return None
+        # The request already folds language, additional instructions and
+        # the structured output arguments into its messages and format.
+        return ResponseCache.key(
+            "ollama",
+            request["model"],
+            request["messages"][0]["content"],
+            request["messages"][1]["content"],
+            None,
+            None,
+            request["options"]["temperature"],
+            response_format=request.get("format"),
+        )
+
+    def _generate_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        response_format: Optional[Union[str, Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        request = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+            response_format,
+            model,
+            **kwargs,
         )
 
-        return response["message"]["content"].strip()
+        key = self._cache_key(request)
+        if key is not None and self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = ollama.chat(**request, stream=False)
+        text = response["message"]["content"].strip()
+
+        if key is not None and self.cache is not None:
+            self.cache.set(key, text)
+
+        return text
+
+    async def _agenerate_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        response_format: Optional[Union[str, Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        """
+        Async version of `_generate_content`, built on `ollama.AsyncClient`.
+        """
+        request = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+            response_format,
+            model,
+            **kwargs,
+        )
+
+        key = self._cache_key(request)
+        if key is not None and self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                return cached
+
+        response = await self.async_client.chat(**request, stream=False)
+        text = response["message"]["content"].strip()
+
+        if key is not None and self.cache is not None:
+            await self.cache.aset(key, text)
+
+        return text
+
+    def _stream_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        response_format: Optional[Union[str, Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        **kwargs,
+    ) -> Iterator[str]:
+        """
+        Like `_generate_content`, but yields the text as it is generated.
+        """
+        request = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+            response_format,
+            model,
+            **kwargs,
+        )
+
+        for part in ollama.chat(**request, stream=True):
+            yield part["message"]["content"]
+
+    async def _astream_content(
+        self,
+        input_text: Union[str, List[Any]],
+        system_instruction: str,
+        max_tokens: int,
+        temperature: float,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        response_format: Optional[Union[str, Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `_stream_content`.
+        """
+        request = self._prepare_request(
+            input_text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+            response_format,
+            model,
+            **kwargs,
+        )
+
+        async for part in await self.async_client.chat(**request, stream=True):
+            yield part["message"]["content"]
 
     def summarize(
         self,
@@ -56,12 +251,7 @@ class OllamaLLM:
         additional_instructions: Optional[List[str]] = None,
         language: Optional[str] = None,
     ) -> str:
-        system_instruction = (
-            "You are an expert summarizer. Provide a comprehensive summary covering all key points, "
-            "using bullet points/headers when helpful."
-            "Be concise while maintaining all crucial information. "
-            "Only output the summary itself without any introductory text."
-        )
+        system_instruction = SUMMARY_INSTRUCTION
 
         # split_texts = smart_split(input_text, max_tokens)
         # summaries = [
@@ -87,6 +277,26 @@ class OllamaLLM:
 
         return summary
 
+    async def asummarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> str:
+        """
+        Async version of `summarize`.
+        """
+        return await self._agenerate_content(
+            input_text,
+            SUMMARY_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
     def answer_question(
         self,
         question: str,
@@ -94,28 +304,46 @@ class OllamaLLM:
         max_tokens: int = 256,
         temperature: float = 0.3,
         language: Optional[str] = None,
+        top_k: Optional[int] = 4,
     ) -> str:
-        system_instruction = (
-            "Answer the question strictly based on the provided context. "
-            "If unsure or if the answer isn't in the context, state that clearly. "
-            "Keep responses concise and factual."
-        )
+        """
+        Answers the question in a single call. Long contexts are split into
+        chunks and only the `top_k` chunks most similar to the question are
+        sent (None sends the whole context).
+        """
+        context = retriever.retrieve(question, context, top_k)
 
-        split_contexts = smart_split(context, max_tokens)
-        answers = []
+        return self._generate_content(
+            input_text=context,
+            system_instruction=ANSWER_INSTRUCTION,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=[f"Question: {question}"],
+            language=language,
+        )
 
-        for chunk in split_contexts:
-            response = self._generate_content(
-                input_text=chunk,
-                system_instruction=system_instruction,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                additional_instructions=[f"Question: {question}"],
-                language=language,
-            )
-            answers.append(response)
+    async def aanswer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 256,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> str:
+        """
+        Async version of `answer_question`.
+        """
+        context = await retriever.aretrieve(question, context, top_k)
 
-        return " ".join(answers)
+        return await self._agenerate_content(
+            input_text=context,
+            system_instruction=ANSWER_INSTRUCTION,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=[f"Question: {question}"],
+            language=language,
+        )
 
     def grammar_corrector(
         self,
@@ -125,11 +353,7 @@ class OllamaLLM:
         additional_instructions: Optional[List[str]] = None,
         language: Optional[str] = None,
     ) -> str:
-        system_instruction = (
-            "You are a professional proofreader. Correct grammar, spelling, and punctuation errors. "
-            "Improve clarity while preserving the original meaning and tone. "
-            "Only output the corrected text without explanations."
-        )
+        system_instruction = GRAMMAR_INSTRUCTION
 
         # split_texts = smart_split(text, max_tokens)
         # corrections = [
@@ -145,7 +369,161 @@ class OllamaLLM:
         # ]
 
         corrections = self._generate_content(
-            text, system_instruction, max_tokens, additional_instructions, language
+            text,
+            system_instruction,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
         )
 
         return corrections
+
+    async def agrammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 512,
+        temperature: float = 0.1,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> str:
+        """
+        Async version of `grammar_corrector`.
+        """
+        return await self._agenerate_content(
+            text,
+            GRAMMAR_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+    def stream_summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming version of `summarize`, yields the summary as it is generated.
+        """
+        yield from self._stream_content(
+            input_text,
+            SUMMARY_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+    def stream_answer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 256,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> Iterator[str]:
+        """
+        Streaming version of `answer_question`.
+        """
+        context = retriever.retrieve(question, context, top_k)
+
+        yield from self._stream_content(
+            input_text=context,
+            system_instruction=ANSWER_INSTRUCTION,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=[f"Question: {question}"],
+            language=language,
+        )
+
+    def stream_grammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 512,
+        temperature: float = 0.1,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming version of `grammar_corrector`.
+        """
+        yield from self._stream_content(
+            text,
+            GRAMMAR_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        )
+
+    async def astream_summarize(
+        self,
+        input_text: str,
+        max_tokens: int = 100,
+        temperature: float = 0.3,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `stream_summarize`.
+        """
+        async for chunk in self._astream_content(
+            input_text,
+            SUMMARY_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        ):
+            yield chunk
+
+    async def astream_answer_question(
+        self,
+        question: str,
+        context: str,
+        max_tokens: int = 256,
+        temperature: float = 0.3,
+        language: Optional[str] = None,
+        top_k: Optional[int] = 4,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `stream_answer_question`.
+        """
+        context = await retriever.aretrieve(question, context, top_k)
+
+        async for part in self._astream_content(
+            input_text=context,
+            system_instruction=ANSWER_INSTRUCTION,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            additional_instructions=[f"Question: {question}"],
+            language=language,
+        ):
+            yield part
+
+    async def astream_grammar_corrector(
+        self,
+        text: str,
+        max_tokens: int = 512,
+        temperature: float = 0.1,
+        additional_instructions: Optional[List[str]] = None,
+        language: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of `stream_grammar_corrector`.
+        """
+        async for chunk in self._astream_content(
+            text,
+            GRAMMAR_INSTRUCTION,
+            max_tokens,
+            temperature,
+            additional_instructions,
+            language,
+        ):
+            yield chunk
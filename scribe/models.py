@@ -0,0 +1,354 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from contextlib import contextmanager
+import gc
+import importlib
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SUMMARIZER_MODEL = "google-t5/t5-base"
+SPACY_MODEL = "en_core_web_sm"
+BERT_MODEL = "bert-base-uncased"
+SBERT_MODEL = "all-mpnet-base-v2"
+QNA_MODEL = "deepset/roberta-base-squad2"
+GRAMMAR_MODEL = "pszemraj/flan-t5-large-grammar-synthesis"
+
+
+class ModelRegistry:
+    """
+    Loads every model once, on first use, and shares it between all the
+    components (and API endpoints) that need it.
+
+    When `memory_budget_mb` is set, loaded models are tracked by size and
+    last use. Loading a model that would exceed the budget first evicts the
+    least recently used models that are not currently in use.
+    """
+
+    def __init__(self, memory_budget_mb: Optional[float] = None):
+        self.memory_budget_mb = memory_budget_mb
+
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._warmups: Dict[str, Callable[[Any], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._sizes: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        self._in_use: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        """
+        Register a zero-argument `loader` that builds the model `name`.
+
+        `warmup`, if given, runs a small representative inference on the
+        loaded model (see `ModelRegistry.warmup`).
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            if warmup is not None:
+                self._warmups[name] = warmup
+            self._locks.setdefault(name, threading.Lock())
+            self._counters.setdefault(
+                name, {"hits": 0, "loads": 0, "reloads": 0, "evictions": 0}
+            )
+
+    def get(self, name: str) -> Any:
+        """
+        Return the model `name`, loading it on the first call.
+        """
+        with self._lock:
+            if name in self._models:
+                self._last_used[name] = time.monotonic()
+                self._counters[name]["hits"] += 1
+                return self._models[name]
+
+        return self._load(name)
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """
+        Like `get`, but the model is never evicted while the block runs.
+        """
+        while True:
+            model = self.get(name)
+            with self._lock:
+                # It may have been evicted between `get` and taking the lock.
+                if self._models.get(name) is model:
+                    self._in_use[name] = self._in_use.get(name, 0) + 1
+                    break
+
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+                self._last_used[name] = time.monotonic()
+
+    def _load(self, name: str) -> Any:
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            # Another thread may have loaded it while we were waiting.
+            if name in self._models:
+                return self._models[name]
+
+            counters = self._counters[name]
+            if counters["loads"]:
+                counters["reloads"] += 1
+                logger.warning(f"Reloading evicted model '{name}'")
+
+            # Make room using the size seen on a previous load, if any.
+            self._evict(self._sizes.get(name, 0), exclude=name)
+
+            model = self._loaders[name]()
+            size = _model_size(model)
+
+            with self._lock:
+                self._models[name] = model
+                self._sizes[name] = size
+                self._last_used[name] = time.monotonic()
+                counters["loads"] += 1
+
+            self._evict(0, exclude=name)
+            return model
+
+    def _evict(self, incoming: int, exclude: str) -> None:
+        if self.memory_budget_mb is None:
+            return
+
+        budget = int(self.memory_budget_mb * 1024 * 1024)
+        evicted = False
+
+        with self._lock:
+            resident = sum(self._sizes[n] for n in self._models)
+            candidates = sorted(
+                (
+                    n
+                    for n in self._models
+                    if n != exclude and self._sizes[n] and not self._in_use.get(n)
+                ),
+                key=lambda n: self._last_used[n],
+            )
+
+            for candidate in candidates:
+                if resident + incoming <= budget:
+                    break
+                del self._models[candidate]
+                resident -= self._sizes[candidate]
+                self._counters[candidate]["evictions"] += 1
+                evicted = True
+                logger.warning(f"Evicted idle model '{candidate}' to fit budget")
+
+        if evicted:
+            gc.collect()
+
+    def memory_usage(self) -> int:
+        """
+        Estimated bytes held by the loaded models.
+        """
+        return sum(self._sizes[n] for n in list(self._models))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                name: {
+                    "loaded": name in self._models,
+                    "size_mb": round(self._sizes.get(name, 0) / 1024 / 1024, 1),
+                    "in_use": self._in_use.get(name, 0),
+                    **counters,
+                }
+                for name, counters in self._counters.items()
+            }
+
+        return {
+            "memory_budget_mb": self.memory_budget_mb,
+            "memory_usage_mb": round(self.memory_usage() / 1024 / 1024, 1),
+            "models": models,
+        }
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def loaded(self) -> List[str]:
+        return list(self._models)
+
+    def names(self) -> List[str]:
+        return list(self._loaders)
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Eagerly load `names` (every registered model by default).
+        """
+        for name in names if names is not None else self.names():
+            self.get(name)
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Load `names` (every registered model by default) and run one
+        inference through each, so lazy kernel initialisation and tokenizer
+        caches are paid for before the first real request.
+        """
+        for name in names if names is not None else self.names():
+            with self.use(name) as model:
+                warmup = self._warmups.get(name)
+                if warmup is not None:
+                    warmup(model)
+
+    def unload(self, name: str) -> None:
+        with self._locks[name], self._lock:
+            self._models.pop(name, None)
+
+
+def _model_size(model: Any) -> int:
+    """
+    Estimate the memory held by a model from its parameters and buffers.
+
+    Pipelines are measured through their `.model`, tuples (tokenizer, model)
+    element-wise. Anything without tensors counts as zero and is never
+    evicted.
+    """
+    if isinstance(model, (tuple, list)):
+        return sum(_model_size(m) for m in model)
+
+    inner = getattr(model, "model", None)
+    if inner is not None and not hasattr(model, "parameters"):
+        return _model_size(inner)
+
+    if hasattr(model, "parameters") and hasattr(model, "buffers"):
+        tensors = itertools.chain(model.parameters(), model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    return 0
+
+
+def _load_summarizer():
+    import transformers
+
+    return transformers.pipeline("summarization", model=SUMMARIZER_MODEL)
+
+
+def _load_spacy():
+    import spacy
+
+    return spacy.load(SPACY_MODEL)
+
+
+def _load_bert():
+    from transformers import BertTokenizer, BertModel
+
+    return (
+        BertTokenizer.from_pretrained(BERT_MODEL),
+        BertModel.from_pretrained(BERT_MODEL),
+    )
+
+
+def _load_sbert():
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(SBERT_MODEL)
+
+
+def _load_qna():
+    from transformers import pipeline
+
+    return pipeline("question-answering", model=QNA_MODEL)
+
+
+def _load_grammar():
+    from transformers import pipeline
+
+    return pipeline("text2text-generation", GRAMMAR_MODEL)
+
+
+def _load_llm():
+    from .llm import LLM
+
+    return LLM()
+
+
+WARMUP_TEXT = (
+    "Artificial intelligence is transforming industries across the globe. "
+    "It offers opportunities for innovation and growth."
+)
+
+
+def _warmup_summarizer(summarizer):
+    summarizer(WARMUP_TEXT, min_length=5, max_length=16)
+
+
+def _warmup_spacy(nlp):
+    nlp(WARMUP_TEXT)
+
+
+def _warmup_bert(bert):
+    import torch
+
+    tokenizer, model = bert
+    with torch.no_grad():
+        model(**tokenizer([WARMUP_TEXT], return_tensors="pt"))
+
+
+def _warmup_sbert(sbert_model):
+    sbert_model.encode([WARMUP_TEXT])
+
+
+def _warmup_qna(oracle):
+    oracle(question="What is transforming industries?", context=WARMUP_TEXT)
+
+
+def _warmup_grammar(corrector):
+    corrector("This are an sentence with errors.")
+
+
+def _load_index():
+    from .index import VectorIndex
+
+    return VectorIndex.from_env()
+
+
+def _load_tfidf_index():
+    from .tfidf import TfidfIndex
+
+    return TfidfIndex.from_env()
+
+
+def _component(path: str, name: str) -> Callable[[], Any]:
+    def load():
+        return getattr(importlib.import_module(path, __package__), name)()
+
+    return load
+
+
+_budget = os.environ.get("SCRIBE_MODEL_MEMORY_BUDGET_MB")
+
+registry = ModelRegistry(memory_budget_mb=float(_budget) if _budget else None)
+
+registry.register("summarizer", _load_summarizer, _warmup_summarizer)
+registry.register("spacy", _load_spacy, _warmup_spacy)
+registry.register("bert", _load_bert, _warmup_bert)
+registry.register("sbert", _load_sbert, _warmup_sbert)
+registry.register("qna", _load_qna, _warmup_qna)
+registry.register("grammar", _load_grammar, _warmup_grammar)
+registry.register("llm", _load_llm)
+registry.register("index", _load_index)
+registry.register("tfidf_index", _load_tfidf_index)
+
+# Components are registered under their class name. They are cheap to build,
+# their models are fetched from the registry the first time a method needs them.
+registry.register("Summary", _component(".summary", "Summary"))
+registry.register("Similarity", _component(".similarity", "Similarity"))
+registry.register("QnA", _component(".qna", "QnA"))
+registry.register("GrammarCorrector", _component(".grammar", "GrammarCorrector"))
+
+MODELS = ["summarizer", "spacy", "bert", "sbert", "qna", "grammar"]
@@ -0,0 +1,142 @@
+from typing import Dict, List, Tuple, TypedDict, Union
+import re
+
+# Paragraph breaks, sentence-final punctuation and words, matched in one
+# pass over the text.
+_SEGMENT_RE = re.compile(
+    r"(?P<paragraph>\r?\n[ \t\r]*\n)"
+    r"|(?P<sentence>[.!?]+(?=[\s\"')\]]|$))"
+    r"|(?P<word>\w+)"
+)
+
+# Words whose trailing period does not end a sentence, casefolded. Single
+# letters (initials) are skipped too.
+_ABBREVIATIONS = set(
+    "mr mrs ms dr prof sr jr st vs etc al fig no vol ch pp inc ltd co "
+    "jan feb mar apr jun jul aug sep sept oct nov dec".split()
+)
+
+UNITS = ["words", "sentences", "paragraphs"]
+
+Span = Tuple[int, int]
+
+
+class CommonUnit(TypedDict):
+    text: str
+    spans1: List[Span]
+    spans2: List[Span]
+
+
+class Segments:
+    """
+    The words, sentences and paragraphs of `text`, found in a single regex
+    pass. Each unit is normalised (case folded, punctuation and whitespace
+    dropped) and mapped to the (start, end) offsets of every place it
+    occurs, in order of first occurrence.
+
+    Sentences end at `.`, `!` or `?`, except for a single period after a
+    common abbreviation ("Dr.", "e.g.") or an initial. This is cheaper than
+    NLTK's punkt model but less thorough: an abbreviation that does end a
+    sentence joins it to the next one.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.units: Dict[str, Dict[str, List[Span]]] = {unit: {} for unit in UNITS}
+
+        sentence: List[str] = []
+        paragraph: List[str] = []
+        sentence_start = paragraph_start = end = 0
+
+        def close(unit: str, words: List[str], start: int) -> None:
+            if words:
+                self._add(unit, " ".join(words), (start, end))
+                words.clear()
+
+        for match in _SEGMENT_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "word":
+                word = match.group().casefold()
+                self._add("words", word, match.span())
+                if not sentence:
+                    sentence_start = match.start()
+                if not paragraph:
+                    paragraph_start = match.start()
+                sentence.append(word)
+                paragraph.append(word)
+                end = match.end()
+            elif kind == "sentence":
+                if match.group() == "." and _abbreviation(sentence, match.start(), end):
+                    continue
+                if sentence:
+                    end = match.end()
+                close("sentences", sentence, sentence_start)
+            else:
+                close("sentences", sentence, sentence_start)
+                close("paragraphs", paragraph, paragraph_start)
+
+        close("sentences", sentence, sentence_start)
+        close("paragraphs", paragraph, paragraph_start)
+
+    def _add(self, unit: str, key: str, span: Span) -> None:
+        self.units[unit].setdefault(key, []).append(span)
+
+    def common(self, other: "Segments") -> Dict[str, List[CommonUnit]]:
+        """
+        The units found in both texts, in their order in this one, with
+        their offsets in each.
+        """
+        result: Dict[str, List[CommonUnit]] = {}
+        for unit in UNITS:
+            theirs = other.units[unit]
+            result[unit] = [
+                {
+                    "text": self.text[spans[0][0] : spans[0][1]],
+                    "spans1": spans,
+                    "spans2": theirs[key],
+                }
+                for key, spans in self.units[unit].items()
+                if key in theirs
+            ]
+        return result
+
+
+def _abbreviation(words: List[str], start: int, end: int) -> bool:
+    # A period right after the last word, which is a known abbreviation or
+    # an initial.
+    if not words or start != end:
+        return False
+    return words[-1] in _ABBREVIATIONS or (len(words[-1]) == 1 and words[-1].isalpha())
+
+
+def find_common_spans(text1: str, text2: str) -> Dict[str, List[CommonUnit]]:
+    """
+    Words, sentences and paragraphs common to both texts, with the offsets
+    of every occurrence in each.
+    """
+    return Segments(text1).common(Segments(text2))
+
+
+def find_common_spans_many(
+    reference: Union[str, Segments], texts: List[str]
+) -> List[Dict[str, List[CommonUnit]]]:
+    """
+    `find_common_spans` of `reference` against each of `texts`, segmenting
+    the reference only once.
+    """
+    if isinstance(reference, str):
+        reference = Segments(reference)
+    return [reference.common(Segments(text)) for text in texts]
+
+
+def find_common_text(text1: str, text2: str) -> dict[str, list[str]]:
+    """
+    find common words, paragraphs, sentences and return
+    them in a list.
+    """
+    common = find_common_spans(text1, text2)
+    return {
+        "common_words": [match["text"] for match in common["words"]],
+        "common_sentences": [match["text"] for match in common["sentences"]],
+        "common_paragraphs": [match["text"] for match in common["paragraphs"]],
+    }
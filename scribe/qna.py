@@ -1,8 +1,12 @@
-from typing import List, Tuple
+from typing import List, Literal, Optional, Tuple
 from typing_extensions import TypedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
-from transformers import pipeline
+from .batching import Runner
 from .llm import LLM
+from .models import QNA_MODEL, ModelRegistry, registry as default_registry
+from .utils import pack_chunks
 
 
 class QuestionList(TypedDict):
@@ -14,11 +18,117 @@ class EvaluationResult(TypedDict):
     feedback: str
 
 
+class Answer(TypedDict):
+    answer: str
+    score: Optional[float]
+    source: str
+
+
+class EvaluationList(TypedDict):
+    evaluations: List[EvaluationResult]
+
+
+EvaluationMode = Literal["single", "batched", "concurrent"]
+
+
 class QnA:
-    def __init__(self):
-        self.model_name = "deepset/roberta-base-squad2"
-        self.oracle = pipeline("question-answering", model=self.model_name)
-        self.llm = LLM()
+    def __init__(
+        self,
+        llm: Optional[LLM] = None,
+        registry: ModelRegistry = default_registry,
+    ):
+        self.model_name = QNA_MODEL
+        self.registry = registry
+        self._llm = llm
+
+    @property
+    def oracle(self):
+        return self.registry.get("qna")
+
+    @property
+    def llm(self) -> LLM:
+        return self._llm if self._llm is not None else self.registry.get("llm")
+
+    def extract_answer(
+        self,
+        question: str,
+        context: str,
+        threshold: float = 0.3,
+        chunk_size: int = 256,
+        batch_size: int = 8,
+    ) -> Optional[Answer]:
+        """
+        Answers the question locally with the extractive RoBERTa model.
+
+        The context is split into chunks of `chunk_size` words, which are
+        read in batches of `batch_size`. The best span is returned if its
+        score reaches `threshold`, otherwise None.
+        """
+        chunks = pack_chunks(context, chunk_size) or [context]
+
+        with self.registry.use("qna") as oracle:
+            results = oracle(
+                question=[question] * len(chunks),
+                context=chunks,
+                batch_size=batch_size,
+            )
+
+        if isinstance(results, dict):
+            results = [results]
+
+        best = max(results, key=lambda result: result["score"])
+        if best["score"] < threshold or not best["answer"].strip():
+            return None
+
+        return {
+            "answer": best["answer"],
+            "score": best["score"],
+            "source": "extractive",
+        }
+
+    def answer(
+        self,
+        question: str,
+        context: str,
+        threshold: float = 0.3,
+        language: Optional[str] = None,
+    ) -> Answer:
+        """
+        Answers the question with `extract_answer` and falls back to the LLM
+        only when the extractive model is not confident enough.
+        """
+        extracted = self.extract_answer(question, context, threshold)
+        if extracted is not None:
+            return extracted
+
+        answer = self.llm.answer_question(question, context, language=language)
+        return {"answer": answer, "score": None, "source": "llm"}
+
+    async def aanswer(
+        self,
+        question: str,
+        context: str,
+        threshold: float = 0.3,
+        language: Optional[str] = None,
+        runner: Optional[Runner] = None,
+    ) -> Answer:
+        """
+        Async version of `answer`. `runner` executes the extractive model off
+        the event loop, e.g. `executor.limiter("qna").run`, by default in a
+        worker thread.
+        """
+        if runner is None:
+            loop = asyncio.get_running_loop()
+            extracted = await loop.run_in_executor(
+                None, self.extract_answer, question, context, threshold
+            )
+        else:
+            extracted = await runner(self.extract_answer, question, context, threshold)
+        if extracted is not None:
+            return extracted
+
+        answer = await self.llm.aanswer_question(question, context, language=language)
+        return {"answer": answer, "score": None, "source": "llm"}
 
     def generate_questions(
         self,
@@ -31,28 +141,101 @@ class QnA:
         """
         Generates questions with structured JSON output
         """
-        system_instruction = (
-            f"Generate {num_questions} relevant questions from the text. "
-            "Return a JSON object with a 'questions' array containing the questions."
+        response = self.llm._generate_content(
+            text,
+            _questions_instruction(num_questions),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            language=language,
+            response_mime_type="application/json",
+            response_schema=QuestionList,
         )
 
-        try:
+        return _parse_questions(response)
+
+    async def agenerate_questions(
+        self,
+        text: str,
+        num_questions: int = 5,
+        language: str = "English",
+        max_tokens: int = 256,
+        temperature: float = 0.7,
+    ) -> List[str]:
+        """
+        Async version of `generate_questions`.
+        """
+        response = await self.llm._agenerate_content(
+            text,
+            _questions_instruction(num_questions),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            language=language,
+            response_mime_type="application/json",
+            response_schema=QuestionList,
+        )
+
+        return _parse_questions(response)
+
+    def evaluate_answers(
+        self,
+        questions: List[str],
+        user_answers: List[str],
+        context: str,
+        language: str = "English",
+        max_tokens: int = 128,
+        temperature: float = 0.5,
+        mode: EvaluationMode = "single",
+        batch_size: int = 20,
+        max_workers: int = 4,
+    ) -> List[Tuple[str, int, str]]:
+        """
+        Evaluates answers with structured JSON output
+
+        Parameters
+        ----------
+        mode: "single" grades one answer per call. "batched" grades up to
+            `batch_size` answers per call, sending the context once per batch.
+            "concurrent" is "batched" with up to `max_workers` batches in flight.
+        """
+        pairs = list(zip(questions, user_answers))
+
+        if mode == "single":
+            results = []
+            for question, answer in pairs:
+                response = self.llm._generate_content(
+                    _evaluation_prompt(question, answer, context),
+                    EVALUATION_INSTRUCTION,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    language=language,
+                    response_mime_type="application/json",
+                    response_schema=EvaluationResult,
+                )
+                results.append(_parse_evaluation(question, response))
+            return results
+
+        def evaluate(batch: List[Tuple[str, str]]) -> List[Tuple[str, int, str]]:
             response = self.llm._generate_content(
-                text,
-                system_instruction,
-                max_tokens=max_tokens,
+                _batch_evaluation_prompt(batch, context),
+                BATCH_EVALUATION_INSTRUCTION,
+                max_tokens=max_tokens * len(batch),
                 temperature=temperature,
                 language=language,
                 response_mime_type="application/json",
-                response_schema=QuestionList,
+                response_schema=EvaluationList,
             )
-            result = json.loads(response)
-            return result.get("questions", [])
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Error parsing questions: {e}")
-            return []
+            return _parse_evaluations(batch, response)
 
-    def evaluate_answers(
+        batches = _batches(pairs, batch_size)
+        if mode == "concurrent":
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                graded = list(executor.map(evaluate, batches))
+        else:
+            graded = [evaluate(batch) for batch in batches]
+
+        return [result for batch in graded for result in batch]
+
+    async def aevaluate_answers(
         self,
         questions: List[str],
         user_answers: List[str],
@@ -60,34 +243,132 @@ class QnA:
         language: str = "English",
         max_tokens: int = 128,
         temperature: float = 0.5,
+        mode: EvaluationMode = "single",
+        batch_size: int = 20,
+        max_workers: int = 4,
     ) -> List[Tuple[str, int, str]]:
         """
-        Evaluates answers with structured JSON output
+        Async version of `evaluate_answers`, the calls (one per answer, or one
+        per batch) run concurrently, at most `max_workers` at a time.
         """
-        results = []
-        for question, answer in zip(questions, user_answers):
-            evaluation_prompt = f"Question: {question}\nUser Answer: {answer}\nCorrect Context: {context}"
+        semaphore = asyncio.Semaphore(max_workers)
+        pairs = list(zip(questions, user_answers))
 
-            try:
-                response = self.llm._generate_content(
-                    evaluation_prompt,
-                    "Evaluate answers and return JSON with 'score' (0-10) and 'feedback'",
+        async def evaluate(question: str, answer: str) -> List[Tuple[str, int, str]]:
+            async with semaphore:
+                response = await self.llm._agenerate_content(
+                    _evaluation_prompt(question, answer, context),
+                    EVALUATION_INSTRUCTION,
                     max_tokens=max_tokens,
                     temperature=temperature,
                     language=language,
                     response_mime_type="application/json",
                     response_schema=EvaluationResult,
                 )
-                evaluation = json.loads(response)
-                results.append(
-                    (
-                        question,
-                        evaluation.get("score", 0),
-                        evaluation.get("feedback", "Evaluation failed"),
-                    )
+            return [_parse_evaluation(question, response)]
+
+        async def evaluate_batch(
+            batch: List[Tuple[str, str]],
+        ) -> List[Tuple[str, int, str]]:
+            async with semaphore:
+                response = await self.llm._agenerate_content(
+                    _batch_evaluation_prompt(batch, context),
+                    BATCH_EVALUATION_INSTRUCTION,
+                    max_tokens=max_tokens * len(batch),
+                    temperature=temperature,
+                    language=language,
+                    response_mime_type="application/json",
+                    response_schema=EvaluationList,
                 )
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Error parsing evaluation: {e}")
-                results.append((question, 0, "Evaluation error"))
+            return _parse_evaluations(batch, response)
+
+        if mode == "single":
+            graded = await asyncio.gather(*(evaluate(q, a) for q, a in pairs))
+        else:
+            graded = await asyncio.gather(
+                *(evaluate_batch(batch) for batch in _batches(pairs, batch_size))
+            )
+
+        return [result for batch in graded for result in batch]
+
+
+EVALUATION_INSTRUCTION = (
+    "Evaluate answers and return JSON with 'score' (0-10) and 'feedback'"
+)
+
+BATCH_EVALUATION_INSTRUCTION = (
+    "Evaluate every numbered answer against the context. Return JSON with an "
+    "'evaluations' array holding one object per answer, in the same order, "
+    "each with 'score' (0-10) and 'feedback'"
+)
+
+
+def _questions_instruction(num_questions: int) -> str:
+    return (
+        f"Generate {num_questions} relevant questions from the text. "
+        "Return a JSON object with a 'questions' array containing the questions."
+    )
+
+
+def _evaluation_prompt(question: str, answer: str, context: str) -> str:
+    return f"Question: {question}\nUser Answer: {answer}\nCorrect Context: {context}"
+
 
-        return results
+def _batch_evaluation_prompt(batch: List[Tuple[str, str]], context: str) -> str:
+    answers = "\n\n".join(
+        f"{i}. Question: {question}\nUser Answer: {answer}"
+        for i, (question, answer) in enumerate(batch, start=1)
+    )
+    return f"Correct Context: {context}\n\n{answers}"
+
+
+def _batches(pairs: List[Tuple[str, str]], size: int) -> List[List[Tuple[str, str]]]:
+    size = max(1, size)
+    return [pairs[i : i + size] for i in range(0, len(pairs), size)]
+
+
+def _parse_questions(response: str) -> List[str]:
+    try:
+        result = json.loads(response)
+        return result.get("questions", [])
+    except (json.JSONDecodeError, KeyError) as e:
+        print(f"Error parsing questions: {e}")
+        return []
+
+
+def _parse_evaluation(question: str, response: str) -> Tuple[str, int, str]:
+    try:
+        evaluation = json.loads(response)
+        return (
+            question,
+            evaluation.get("score", 0),
+            evaluation.get("feedback", "Evaluation failed"),
+        )
+    except (json.JSONDecodeError, KeyError) as e:
+        print(f"Error parsing evaluation: {e}")
+        return (question, 0, "Evaluation error")
+
+
+def _parse_evaluations(
+    batch: List[Tuple[str, str]], response: str
+) -> List[Tuple[str, int, str]]:
+    try:
+        evaluations = json.loads(response)["evaluations"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"Error parsing evaluations: {e}")
+        evaluations = []
+
+    results = []
+    for i, (question, _) in enumerate(batch):
+        if i < len(evaluations) and isinstance(evaluations[i], dict):
+            evaluation = evaluations[i]
+            results.append(
+                (
+                    question,
+                    evaluation.get("score", 0),
+                    evaluation.get("feedback", "Evaluation failed"),
+                )
+            )
+        else:
+            results.append((question, 0, "Evaluation error"))
+    return results
@@ -0,0 +1,83 @@
+from typing import Tuple
+
+import numpy as np
+
+STORAGES = ["float32", "int8", "binary"]
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-vector int8 quantization: `vectors ≈ codes * scales[:, None]`.
+    A quarter of the float32 size, plus one float per vector.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def int8_scores(
+    queries: np.ndarray, codes: np.ndarray, scales: np.ndarray
+) -> np.ndarray:
+    """
+    Dot products of float `queries` with int8 `codes`, one row per query.
+
+    NumPy has no int8 GEMM, so the codes are widened to float32 one block
+    at a time and multiplied with BLAS. Keeping the queries in float32
+    (asymmetric scoring) also loses less recall than quantizing them.
+    """
+    return (queries @ np.asarray(codes, dtype=np.float32).T) * scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """
+    One bit per dimension, its sign, packed eight to a byte: 1/32 of the
+    float32 size.
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[x.view(np.uint8)].reshape(*x.shape, -1).sum(
+            axis=-1, dtype=np.uint16
+        )
+
+
+def hamming_scores(queries: np.ndarray, codes: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Similarity of packed binary `queries` and `codes`, one row per query:
+    `1 - 2 * hamming / dim`, which tracks the angle between the vectors.
+
+    Codes are compared 64 bits at a time when their width allows it. The
+    loop runs over those words, each step XORs one word of every code with
+    the same word of every query and adds up the popcounts.
+    """
+    codes = np.ascontiguousarray(codes)
+    queries = np.ascontiguousarray(queries)
+    if codes.shape[1] % 8 == 0:
+        codes = codes.view(np.uint64)
+        queries = queries.view(np.uint64)
+
+    words = np.ascontiguousarray(codes.T)
+    distances = np.zeros((len(queries), len(codes)), dtype=np.uint32)
+    for word, query_word in zip(words, queries.T):
+        distances += _popcount(np.bitwise_xor(word[None, :], query_word[:, None]))
+
+    return 1 - 2 * distances.astype(np.float32) / dim
+
+
+def nbytes(count: int, dim: int, storage: str) -> int:
+    """
+    Bytes needed to store `count` vectors of `dim` dimensions as `storage`.
+    """
+    if storage == "int8":
+        return count * (dim + 4)
+    if storage == "binary":
+        return count * ((dim + 7) // 8)
+    return count * dim * 4
@@ -0,0 +1,123 @@
+from typing import List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import threading
+
+from .batching import sbert_batcher
+from .models import ModelRegistry, registry as default_registry
+from .utils import count_tokens, pack_chunks
+
+
+class ContextRetriever:
+    """
+    Picks the parts of a long context that are relevant to a question, so it
+    can be answered with a single LLM call.
+
+    The context is split into chunks of `chunk_size` words, embedded once
+    with the SBERT model from `Similarity`, and the chunks closest to the
+    question are kept. Embeddings of the last `cache_size` contexts are
+    reused, so asking several questions about one document embeds it once.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry = default_registry,
+        chunk_size: int = 256,
+        cache_size: int = 32,
+    ):
+        self.registry = registry
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, Tuple[List[str], object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, context: str) -> Tuple[str, Optional[Tuple[List[str], object]]]:
+        key = hashlib.sha256(f"{self.chunk_size}:{context}".encode()).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return key, self._cache[key]
+        return key, None
+
+    def _remember(self, key: str, chunks: List[str], embeddings) -> None:
+        with self._lock:
+            self._cache[key] = (chunks, embeddings)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _embed_context(self, context: str):
+        key, cached = self._cached(context)
+        if cached is not None:
+            return cached
+
+        chunks = pack_chunks(context, self.chunk_size)
+        embeddings = _normalize(self.registry.get("Similarity").sbert_encode(chunks))
+        self._remember(key, chunks, embeddings)
+        return chunks, embeddings
+
+    async def _aembed_context(self, context: str):
+        key, cached = self._cached(context)
+        if cached is not None:
+            return cached
+
+        chunks = await asyncio.to_thread(pack_chunks, context, self.chunk_size)
+        embeddings = _normalize(await sbert_batcher.submit(chunks))
+        self._remember(key, chunks, embeddings)
+        return chunks, embeddings
+
+    def retrieve(self, question: str, context: str, top_k: Optional[int] = 4) -> str:
+        """
+        The `top_k` chunks of `context` most similar to `question`, in their
+        original order. Contexts that already fit in `top_k` chunks, or a
+        `top_k` of None, return the context unchanged.
+        """
+        if not top_k or count_tokens(context) <= self.chunk_size * top_k:
+            return context
+
+        chunks, embeddings = self._embed_context(context)
+        if len(chunks) <= top_k:
+            return context
+
+        query = _normalize(self.registry.get("Similarity").sbert_encode([question]))
+        return _best(chunks, embeddings, query, top_k)
+
+    async def aretrieve(
+        self, question: str, context: str, top_k: Optional[int] = 4
+    ) -> str:
+        """
+        Async version of `retrieve`. The context and question are encoded
+        through the shared SBERT batcher, so they wait in the `sbert`
+        limiter and share forward passes with the similarity endpoints.
+        """
+        if self.registry is not default_registry:
+            # The shared batcher encodes with the default registry's model.
+            return await asyncio.to_thread(self.retrieve, question, context, top_k)
+
+        if not top_k or count_tokens(context) <= self.chunk_size * top_k:
+            return context
+
+        chunks, embeddings = await self._aembed_context(context)
+        if len(chunks) <= top_k:
+            return context
+
+        query = _normalize(await sbert_batcher.submit([question]))
+        return _best(chunks, embeddings, query, top_k)
+
+
+def _best(chunks: List[str], embeddings, query, top_k: int) -> str:
+    scores = embeddings @ query[0]
+    best = sorted(scores.argsort()[::-1][:top_k])
+    return "\n\n".join(chunks[i] for i in best)
+
+
+def _normalize(embeddings):
+    import numpy as np
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+retriever = ContextRetriever()
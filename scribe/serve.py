@@ -0,0 +1,198 @@
+"""
+Pre-fork server for the scribe API.
+
+The models are loaded once in the parent process, then the workers are forked
+from it. Model weights live in memory that is never written after loading, so
+the workers share the parent's pages copy-on-write instead of each holding its
+own copy.
+
+    python -m scribe.serve --workers 4 --preload all
+"""
+from typing import Dict, List, Optional
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# A worker exiting within MIN_UPTIME seconds of its start most likely failed
+# to start, e.g. a broken import or running out of memory while loading.
+# Restarts after such exits back off, and the server gives up after
+# MAX_FAST_EXITS of them in a row.
+MIN_UPTIME = 10.0
+MAX_FAST_EXITS = 5
+MAX_BACKOFF = 30.0
+
+
+def preload_models(value: str) -> List[str]:
+    from .models import MODELS
+
+    if value.lower() == "all":
+        return MODELS
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, threads: int, log_level: str) -> None:
+    import uvicorn
+
+    # Each worker gets its share of the cores, otherwise N workers each
+    # spawning one torch thread per core oversubscribe the CPU.
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    from .api import app
+
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(sock: socket.socket, threads: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, threads, log_level)
+        except Exception:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    workers: int = 2,
+    preload: Optional[List[str]] = None,
+    log_level: str = "error",
+) -> int:
+    """
+    Load `preload` in this process, then fork `workers` uvicorn workers that
+    accept connections on one shared socket. Workers that die are restarted,
+    with a growing delay when they die right after starting. Returns 1 if
+    the workers kept failing at startup, 0 otherwise.
+    """
+    from .models import registry
+
+    sock = bind_socket(host, port)
+
+    # Import the app before forking so the workers share its modules too.
+    from . import api  # noqa: F401
+
+    if preload:
+        registry.preload(preload)
+
+    # Move everything allocated so far out of the garbage collector's reach,
+    # so collections in the workers do not touch (and copy) shared pages.
+    gc.collect()
+    gc.freeze()
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Start time of each worker, by pid.
+    children: Dict[int, float] = {}
+    stopping = False
+    fast_exits = 0
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children[spawn_worker(sock, threads, log_level)] = time.monotonic()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+
+        if time.monotonic() - started < MIN_UPTIME:
+            fast_exits += 1
+        else:
+            fast_exits = 0
+
+        if fast_exits >= MAX_FAST_EXITS:
+            logger.error(
+                f"Workers exited {fast_exits} times in a row right after "
+                "starting, giving up"
+            )
+            stop(None, None)
+            continue
+
+        delay = min(MAX_BACKOFF, 0.5 * 2**fast_exits) if fast_exits else 0.0
+        logger.error(
+            f"Worker {pid} exited with status {status}, restarting in {delay:.1f}s"
+        )
+        time.sleep(delay)
+        if not stopping:
+            children[spawn_worker(sock, threads, log_level)] = time.monotonic()
+
+    sock.close()
+    return 1 if fast_exits >= MAX_FAST_EXITS else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--preload",
+        default=os.environ.get("SCRIBE_PRELOAD", ""),
+        help='Models to load before forking, comma separated or "all".',
+    )
+    parser.add_argument("--log-level", default="error")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("scribe.serve needs os.fork, use `fastapi run` on this platform")
+        return 1
+
+    return serve(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        preload=preload_models(args.preload),
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,83 +1,225 @@
-from typing import List
+from typing import List, Literal, Optional, Tuple, Union
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 from sklearn.feature_extraction.text import TfidfVectorizer
-from transformers import BertTokenizer, BertModel
-from sentence_transformers import SentenceTransformer
-from nltk.tokenize import word_tokenize, sent_tokenize, blankline_tokenize
+from .embeddings import EmbeddingCache
+from .overlap import find_common_text  # noqa: F401, kept importable from here
+from .models import BERT_MODEL, SBERT_MODEL, ModelRegistry, registry as default_registry
+import numpy as np
 import torch
 import warnings
 
 warnings.filterwarnings("ignore")
 
+# (i, j, score) pairs, returned instead of the matrix when `top_k` or
+# `threshold` is set.
+Pairs = List[Tuple[int, int, float]]
+
 
 class Similarity:
-    def __init__(self):
-        self.bert_tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
-        self.bert_model = BertModel.from_pretrained("bert-base-uncased")
+    def __init__(
+        self,
+        registry: ModelRegistry = default_registry,
+        embedding_cache: Optional[EmbeddingCache] = None,
+    ):
+        self.registry = registry
+        self.sbert_model_name = SBERT_MODEL
+        self.bert_model_name = BERT_MODEL
+        self.embedding_cache = embedding_cache or EmbeddingCache.from_env()
+
+    @property
+    def bert_tokenizer(self):
+        return self.registry.get("bert")[0]
+
+    @property
+    def bert_model(self):
+        return self.registry.get("bert")[1]
+
+    @property
+    def sbert_model(self):
+        return self.registry.get("sbert")
 
-        self.sbert_model_name = "all-mpnet-base-v2"
-        self.sbert_model = SentenceTransformer(self.sbert_model_name)
+    def bert_encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        pooling: Literal["cls", "mean"] = "cls",
+    ) -> np.ndarray:
+        """
+        Encode sentences into BERT embeddings, one row per sentence.
 
-    def _tokenize_sentences(self, sentences: List[str]):
-        tokens = self.bert_tokenizer(
+        `pooling` is "cls" for the [CLS] token or "mean" for the average of
+        the token embeddings. Sentences seen before are served from the
+        embedding cache.
+        """
+        return self.embedding_cache.encode(
+            f"{self.bert_model_name}:{pooling}",
             sentences,
-            return_tensors="pt",
-            padding=True,
-            truncation=True,
-            max_length=512,
+            lambda texts: self._bert_encode(texts, batch_size, pooling),
         )
-        return tokens["input_ids"], tokens["attention_mask"]
 
-    def bert_similarity(self, sentences: List[str]) -> List[List[float]]:
-        """
-        Compute similarity using BERT embeddings for two sentences.
+    def _bert_encode(
+        self, sentences: List[str], batch_size: int, pooling: str
+    ) -> np.ndarray:
+        with self.registry.use("bert") as (tokenizer, model):
+            tokens = tokenizer(sentences, truncation=True, max_length=512)
+
+            # Batch sentences of similar length, so a long one does not make
+            # every other sentence pad up to it.
+            order = sorted(
+                range(len(sentences)), key=lambda i: len(tokens["input_ids"][i])
+            )
+            embeddings = np.empty(
+                (len(sentences), model.config.hidden_size), dtype=np.float32
+            )
+
+            with torch.inference_mode():
+                for start in range(0, len(order), batch_size):
+                    batch = order[start : start + batch_size]
+                    features = {k: [v[i] for i in batch] for k, v in tokens.items()}
+                    inputs = tokenizer.pad(features, return_tensors="pt")
+                    hidden = model(**inputs).last_hidden_state
+
+                    if pooling == "mean":
+                        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                        total = (hidden * mask).sum(dim=1)
+                        pooled = total / mask.sum(dim=1).clamp(min=1)
+                    else:
+                        pooled = hidden[:, 0, :]
+
+                    embeddings[batch] = pooled.float().numpy()
+
+            return embeddings
+
+    def bert_similarity(
+        self,
+        sentences: List[str],
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = None,
+        batch_size: int = 32,
+        pooling: Literal["cls", "mean"] = "cls",
+    ) -> Union[List[List[float]], Pairs]:
         """
-        input_ids, attention_mask = self._tokenize_sentences(sentences)
+        Compute the pairwise similarity of all the sentences using BERT
+        embeddings, as an N×N matrix.
 
-        with torch.no_grad():
-            outputs = self.bert_model(input_ids, attention_mask=attention_mask)
-            sentence_embeddings = outputs.last_hidden_state[:, 0, :].numpy()
+        With `top_k` or `threshold` set, returns sparse (i, j, score) pairs
+        instead, see `cosine_neighbours`.
+        """
+        sentence_embeddings = self.bert_encode(sentences, batch_size, pooling)
+        if top_k is not None or threshold is not None:
+            return cosine_neighbours(sentence_embeddings, top_k, threshold)
 
-        similarity = cosine_similarity([sentence_embeddings[0], sentence_embeddings[1]])
+        similarity = cosine_similarity(sentence_embeddings)
         return similarity
 
-    def sbert_similarity(self, paragraphs: List[str]) -> List[List[float]]:
+    def sbert_encode(self, paragraphs: List[str]) -> np.ndarray:
+        """
+        Encode paragraphs into SBERT embeddings, one row per paragraph.
+        Paragraphs seen before are served from the embedding cache.
+        """
+        return self.embedding_cache.encode(
+            self.sbert_model_name, paragraphs, self._sbert_encode
+        )
+
+    def _sbert_encode(self, paragraphs: List[str]) -> np.ndarray:
+        with self.registry.use("sbert") as sbert_model:
+            return sbert_model.encode(paragraphs)
+
+    def sbert_similarity(
+        self,
+        paragraphs: List[str],
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> Union[List[List[float]], Pairs]:
         """
         Compute similarity using SBERT embeddings for multiple paragraphs.
+
+        With `top_k` or `threshold` set, returns sparse (i, j, score) pairs
+        instead of the full matrix, see `cosine_neighbours`.
         """
-        embeddings = self.sbert_model.encode(paragraphs)
+        embeddings = self.sbert_encode(paragraphs)
+        if top_k is not None or threshold is not None:
+            return cosine_neighbours(embeddings, top_k, threshold)
+
         similarities = cosine_similarity(embeddings)
         return similarities
 
-    def tfidf_cosine_similarity(self, sentences: List[str]) -> List[List[float]]:
+    def tfidf_cosine_similarity(
+        self,
+        sentences: List[str],
+        top_k: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> Union[List[List[float]], Pairs]:
         """
         Compute similarity using TF-IDF vectorization and cosine similarity for multiple sentences.
+
+        With `top_k` or `threshold` set, returns sparse (i, j, score) pairs
+        instead of the full matrix, see `cosine_neighbours`.
         """
         vectorizer = TfidfVectorizer().fit_transform(sentences)
-        vectors = vectorizer.toarray()
-        cosine_sim = cosine_similarity(vectors)
+        if top_k is not None or threshold is not None:
+            return cosine_neighbours(vectorizer, top_k, threshold)
+
+        # The rows are L2-normalised, so the sparse product is the cosine
+        # similarity. Only the N×N result is made dense, never N × vocabulary.
+        cosine_sim = (vectorizer @ vectorizer.T).toarray()
         return cosine_sim
 
 
-def find_common_text(text1: str, text2: str) -> dict[str, list[str]]:
+def cosine_neighbours(
+    embeddings,
+    top_k: Optional[int] = None,
+    threshold: Optional[float] = None,
+    block_size: int = 1024,
+) -> Pairs:
     """
-    find common words, paragraphs, sentences and return
-    them in a list.
+    Sparse cosine similarity between the rows of `embeddings` (a dense
+    array or a scipy sparse matrix), as (i, j, score) pairs.
+
+    With `top_k`, each row's `top_k` most similar other rows, best first.
+    With only `threshold`, every pair i < j scoring at least `threshold`.
+    With both, the top-k neighbours scoring at least `threshold`.
+
+    The matrix is computed `block_size` rows at a time, so memory stays
+    linear in the number of rows.
     """
-    words1 = set(word_tokenize(text1))
-    words2 = set(word_tokenize(text2))
-    common_words = list(words1 & words2)
-
-    sentence1 = set(sent_tokenize(text1))
-    sentence2 = set(sent_tokenize(text2))
-    common_sentences = list(sentence1 & sentence2)
-
-    paragraph1 = set(blankline_tokenize(text1))
-    paragraph2 = set(blankline_tokenize(text2))
-    common_paragraphs = list(paragraph1 & paragraph2)
-
-    return {
-        "common_words": common_words,
-        "common_sentences": common_sentences,
-        "common_paragraphs": common_paragraphs,
-    }
+    if top_k is None and threshold is None:
+        raise ValueError("Set top_k, threshold or both")
+
+    embeddings = normalize(embeddings)
+    n = embeddings.shape[0]
+    pairs: Pairs = []
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        scores = embeddings[start:stop] @ embeddings.T
+        scores = scores.toarray() if hasattr(scores, "toarray") else np.asarray(scores)
+
+        rows = np.arange(stop - start)
+        # A row is not its own neighbour.
+        scores[rows, start + rows] = -np.inf
+
+        if top_k is not None:
+            k = min(top_k, n - 1)
+            if k <= 0:
+                break
+            cols = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            values = np.take_along_axis(scores, cols, axis=1)
+            order = np.argsort(-values, axis=1)
+            cols = np.take_along_axis(cols, order, axis=1)
+            values = np.take_along_axis(values, order, axis=1)
+
+            for r in rows:
+                for j, score in zip(cols[r], values[r]):
+                    if threshold is None or score >= threshold:
+                        pairs.append((start + int(r), int(j), float(score)))
+        else:
+            r, j = np.nonzero(scores >= threshold)
+            upper = j > start + r
+            for i, j, score in zip(
+                start + r[upper], j[upper], scores[r[upper], j[upper]]
+            ):
+                pairs.append((int(i), int(j), float(score)))
+
+    return pairs
@@ -0,0 +1,50 @@
+from typing import IO, Any, Iterator
+from contextlib import contextmanager
+import json
+import os
+
+
+@contextmanager
+def flock(f: IO[Any], shared: bool = False) -> Iterator[None]:
+    """
+    Hold an advisory lock on the open file `f`, across processes. Readers
+    can share it, writers hold it alone.
+    """
+    # Unix only, imported here so stores kept in memory work everywhere.
+    import fcntl
+
+    fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def lock_file(path: str, shared: bool = False) -> Iterator[None]:
+    """
+    `flock` on the file at `path`, created if needed.
+    """
+    with open(path, "w") as f, flock(f, shared):
+        yield
+
+
+def read_manifest(path: str, default: dict) -> dict:
+    """
+    The JSON manifest at `path`, or a copy of `default` if there is none.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict(default)
+
+
+def write_manifest(path: str, manifest: dict) -> None:
+    """
+    Atomically replace the JSON manifest at `path`, readers see either the
+    old or the new one.
+    """
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
@@ -1,18 +1,23 @@
 from typing import List, Tuple
-import transformers
-import spacy
 from collections import Counter
+from .models import ModelRegistry, registry as default_registry
+from .utils import count_tokens, pack_chunks
 import warnings
 
 warnings.filterwarnings("ignore")
 
 
 class Summary:
-    def __init__(self):
-        self.summarizer = transformers.pipeline(
-            "summarization", model="google-t5/t5-base"
-        )
-        self.nlp = spacy.load("en_core_web_sm")
+    def __init__(self, registry: ModelRegistry = default_registry):
+        self.registry = registry
+
+    @property
+    def summarizer(self):
+        return self.registry.get("summarizer")
+
+    @property
+    def nlp(self):
+        return self.registry.get("spacy")
 
     def bart_summarize(
         self,
@@ -20,21 +25,67 @@ class Summary:
         min_length: int = 5,
         max_length: int = 64,
         percentage: float = 0.40,
+        long_document: bool = False,
+        batch_size: int = 4,
     ) -> List[str]:
         """
         Summarize the input text using BART.
+
+        The model only reads its first 512 tokens. With `long_document`,
+        longer texts are split into chunks that fit, the chunks are summarized
+        in batches of `batch_size`, and the joined chunk summaries are
+        summarized again until they fit in one pass.
         """
-        doc = self.nlp(text)
+        with self.registry.use("summarizer") as summarizer:
+            tokenizer = summarizer.tokenizer
+            num_tokens = count_tokens(text, tokenizer)
+
+            if not max_length or max_length > num_tokens:
+                max_length = int(num_tokens * percentage)
+
+            min_length = max(5, int(max_length * 0.5))
+
+            window = _window(tokenizer)
+            if long_document and num_tokens > window:
+                text = self._reduce_long(
+                    summarizer, text, window, percentage, batch_size
+                )
 
-        tokens = [token.text for token in doc]
-        num_tokens = len(tokens)
+            return summarizer(
+                text, min_length=min_length, max_length=max_length, truncation=True
+            )[0]
 
-        if not max_length or max_length > num_tokens:
-            max_length = int(num_tokens * percentage)
+    def _reduce_long(
+        self,
+        summarizer,
+        text: str,
+        window: int,
+        percentage: float,
+        batch_size: int,
+    ) -> str:
+        """
+        Summarize chunks of `text` until the result fits in `window` tokens.
+        """
+        tokenizer = summarizer.tokenizer
+        chunk_max_length = max(16, int(window * percentage))
+        chunk_min_length = max(5, chunk_max_length // 4)
 
-        min_length = max(5, int(max_length * 0.5))
+        while True:
+            chunks = pack_chunks(text, window, tokenizer)
+            outputs = summarizer(
+                chunks,
+                min_length=chunk_min_length,
+                max_length=chunk_max_length,
+                batch_size=batch_size,
+                truncation=True,
+            )
+            reduced = "\n".join(output["summary_text"] for output in outputs)
 
-        return self.summarizer(text, min_length=min_length, max_length=max_length)[0]
+            num_tokens = count_tokens(reduced, tokenizer)
+            # Stop once it fits, or if a pass no longer makes it shorter.
+            if num_tokens <= window or num_tokens >= count_tokens(text, tokenizer):
+                return reduced
+            text = reduced
 
     def spacy_extract_keywords(
         self, text: str, num_keywords: int = 10
@@ -42,9 +93,18 @@ class Summary:
         """
         Extract keywords from the input text using spaCy.
         """
-        doc = self.nlp(text)
+        with self.registry.use("spacy") as nlp:
+            doc = nlp(text)
         keywords = [
             token.text for token in doc if (token.is_alpha) and not token.is_stop
         ]
         keyword_freq = Counter(keywords)
         return keyword_freq.most_common(num_keywords)
+
+
+def _window(tokenizer) -> int:
+    """
+    Tokens of input the model reads, leaving room for the task prefix and
+    special tokens. Some tokenizers report a huge sentinel as their maximum.
+    """
+    return min(tokenizer.model_max_length, 1024) - 16
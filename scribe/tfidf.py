@@ -0,0 +1,280 @@
+from typing import Any, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .storage import lock_file, read_manifest, write_manifest
+
+
+class TfidfIndex:
+    """
+    TF-IDF search over a stored corpus that stays sparse end to end.
+
+    `fit` learns the vocabulary and IDF weights once, on a reference corpus,
+    and keeps its L2-normalised TF-IDF rows as CSR matrices. `add` appends
+    more documents with the same vocabulary, and `search` scores new texts
+    against every stored document with sparse matrix products, so the cost
+    follows the number of shared terms rather than N × vocabulary.
+
+    When `path` is set the index lives in that directory: the pickled
+    vectorizer, one `save_npz` shard and ids file per `fit` or `add` call,
+    and a manifest listing them, written last with a version counter. Each
+    `add` only writes its own rows, so add documents in batches rather than
+    one at a time, and `compact` merges the shards back into one. Writers
+    hold the file lock exclusively and readers share it, so `refresh` never
+    sees half of a write.
+    """
+
+    def __init__(self, path: Optional[str] = None, **vectorizer_args: Any):
+        self.path = path
+        self.vectorizer_args = vectorizer_args
+
+        self.vectorizer: Optional[TfidfVectorizer] = None
+        self.ids: List[str] = []
+
+        self._parts: List[sp.csr_matrix] = []
+        self._shards: List[str] = []
+        self._version = 0
+        self._fit_version = 0
+        self._lock = threading.RLock()
+        self._held = False
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            self.refresh()
+
+    @classmethod
+    def from_env(cls) -> "TfidfIndex":
+        """
+        The index stored in `SCRIBE_TFIDF_INDEX`, or an in-memory one when
+        unset.
+        """
+        return cls(os.environ.get("SCRIBE_TFIDF_INDEX") or None)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def fitted(self) -> bool:
+        return self.vectorizer is not None
+
+    @property
+    def matrix(self) -> sp.csr_matrix:
+        """
+        TF-IDF rows of every stored document, in id order.
+        """
+        if not self._parts:
+            return sp.csr_matrix((0, 0))
+        return sp.vstack(self._parts, format="csr")
+
+    def _file(self, name: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def locked(self, shared: bool = False) -> Iterator[None]:
+        """
+        Hold the index lock, across threads and, for an index on disk,
+        across processes. Nested calls reuse the lock already held.
+        """
+        with self._lock:
+            if not self.path or self._held:
+                yield
+                return
+
+            with lock_file(self._file(".lock"), shared):
+                self._held = True
+                try:
+                    yield
+                finally:
+                    self._held = False
+
+    def _manifest(self) -> dict:
+        return read_manifest(
+            self._file("manifest.json"), {"version": 0, "fit_version": 0, "shards": []}
+        )
+
+    def _write_manifest(self, manifest: dict) -> None:
+        write_manifest(self._file("manifest.json"), manifest)
+
+    def refresh(self) -> bool:
+        """
+        Reload the index from disk if another writer saved it since. Only
+        the shards added since the last refresh are read. Returns whether
+        anything was reloaded.
+        """
+        if not self.path:
+            return False
+
+        with self.locked(shared=True):
+            manifest = self._manifest()
+            if manifest["version"] == self._version:
+                return False
+
+            shards = manifest["shards"]
+            if (
+                manifest["fit_version"] != self._fit_version
+                or shards[: len(self._shards)] != self._shards
+            ):
+                with open(self._file("vectorizer.pkl"), "rb") as f:
+                    self.vectorizer = pickle.load(f)
+                self._parts, self._shards, self.ids = [], [], []
+
+            for shard in shards[len(self._shards) :]:
+                self._parts.append(sp.load_npz(self._file(f"{shard}.npz")).tocsr())
+                with open(self._file(f"{shard}.json"), encoding="utf-8") as f:
+                    self.ids.extend(json.load(f))
+                self._shards.append(shard)
+
+            self._version = manifest["version"]
+            self._fit_version = manifest["fit_version"]
+            return True
+
+    def _write_shard(self, rows: sp.csr_matrix, ids: List[str]) -> str:
+        shard = f"matrix-{self._version + 1}"
+        sp.save_npz(self._file(f"{shard}.tmp.npz"), rows)
+        os.replace(self._file(f"{shard}.tmp.npz"), self._file(f"{shard}.npz"))
+        with open(self._file(f"{shard}.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        return shard
+
+    def _replace_shards(self, fitted: bool) -> None:
+        # Rewrite the whole index as a single shard, dropping the old ones
+        # once the manifest no longer lists them.
+        old = self._manifest()["shards"]
+        if fitted:
+            with open(self._file("vectorizer.pkl.tmp"), "wb") as f:
+                pickle.dump(self.vectorizer, f)
+            os.replace(self._file("vectorizer.pkl.tmp"), self._file("vectorizer.pkl"))
+
+        shard = self._write_shard(self.matrix, self.ids)
+        self._write_manifest(
+            {
+                "version": self._version + 1,
+                "fit_version": self._fit_version + int(fitted),
+                "shards": [shard],
+            }
+        )
+        self._version += 1
+        self._fit_version += int(fitted)
+        self._parts, self._shards = [self.matrix], [shard]
+
+        for name in old:
+            for ext in (".npz", ".json"):
+                if os.path.exists(self._file(name + ext)):
+                    os.remove(self._file(name + ext))
+
+    def fit(self, texts: List[str], ids: Optional[List[str]] = None) -> "TfidfIndex":
+        """
+        Learn the vocabulary and IDF from `texts` and make them the corpus,
+        replacing anything stored before.
+        """
+        ids = _ids(texts, ids, 0)
+
+        with self.locked():
+            self.refresh()
+            vectorizer = TfidfVectorizer(**self.vectorizer_args)
+            self._parts = [vectorizer.fit_transform(texts).tocsr()]
+            self.vectorizer = vectorizer
+            self.ids = ids
+
+            if self.path:
+                self._replace_shards(fitted=True)
+        return self
+
+    def compact(self) -> None:
+        """
+        Merge the shards written by `add` into one.
+        """
+        with self.locked():
+            self.refresh()
+            if self.path and len(self._shards) > 1:
+                self._replace_shards(fitted=False)
+
+    def transform(self, texts: List[str]) -> sp.csr_matrix:
+        """
+        Sparse, L2-normalised TF-IDF rows of `texts` in the fitted vocabulary.
+        """
+        if self.vectorizer is None:
+            raise ValueError("The TF-IDF index has not been fitted")
+        return self.vectorizer.transform(texts).tocsr()
+
+    def add(self, texts: List[str], ids: Optional[List[str]] = None) -> None:
+        """
+        Add `texts` to the corpus, weighted with the fitted vocabulary and
+        IDF. Fits on them first if the index is empty. On disk, only the new
+        rows are written.
+        """
+        with self.locked():
+            self.refresh()
+            if not self.fitted:
+                self.fit(texts, ids)
+                return
+
+            ids = _ids(texts, ids, len(self.ids))
+            rows = self.transform(texts)
+
+            if self.path:
+                shard = self._write_shard(rows, ids)
+                manifest = self._manifest()
+                manifest.update(
+                    version=self._version + 1, shards=manifest["shards"] + [shard]
+                )
+                self._write_manifest(manifest)
+                self._version += 1
+                self._shards.append(shard)
+
+            self._parts.append(rows)
+            self.ids.extend(ids)
+
+    def scores(self, texts: List[str]) -> sp.csr_matrix:
+        """
+        Cosine similarity of each of `texts` (rows) with every stored
+        document (columns), as a sparse matrix.
+        """
+        with self._lock:
+            queries = self.transform(texts)
+            if not self._parts:
+                return sp.csr_matrix((len(texts), 0))
+            return sp.hstack([queries @ part.T for part in self._parts], format="csr")
+
+    def search(
+        self, texts: List[str], top_k: int = 10
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        The `top_k` (id, score) pairs most similar to each of `texts`, best
+        first. Documents sharing no term with a text are never returned, and
+        an index that was never fitted returns no results.
+        """
+        with self._lock:
+            if not self.fitted:
+                return [[] for _ in texts]
+
+            scores = self.scores(texts)
+            results = []
+            for row in range(scores.shape[0]):
+                start, stop = scores.indptr[row], scores.indptr[row + 1]
+                cols, values = scores.indices[start:stop], scores.data[start:stop]
+
+                k = min(top_k, len(values))
+                if not k:
+                    results.append([])
+                    continue
+                top = np.argpartition(-values, k - 1)[:k]
+                top = top[np.argsort(-values[top])]
+                results.append([(self.ids[cols[i]], float(values[i])) for i in top])
+            return results
+
+
+def _ids(texts: List[str], ids: Optional[List[str]], offset: int) -> List[str]:
+    if ids is None:
+        return [str(offset + i) for i in range(len(texts))]
+    if len(ids) != len(texts):
+        raise ValueError(f"Got {len(ids)} ids for {len(texts)} texts")
+    return list(ids)
@@ -1,7 +1,14 @@
-from nltk import sent_tokenize, word_tokenize
+from typing import Any, Iterator, List, Optional, Tuple
+from bisect import bisect_left
+import re
+
+# Words and single punctuation marks, a cheap stand-in for word_tokenize.
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
 
 
 def smart_split(text, n):
+    from nltk import sent_tokenize, word_tokenize
+
     original_lines = text.split("\n")
     chunks = []
     paragraph_ids = []
@@ -36,6 +43,132 @@ def smart_split(text, n):
     return chunks, paragraph_ids
 
 
+def iter_split(
+    text: str, n: int, tokenizer: Optional[Any] = None
+) -> Iterator[Tuple[str, int]]:
+    """
+    Streaming, faster version of `smart_split`, yields `(chunk, paragraph_id)`.
+
+    The document is tokenized once, up front, and sentence lengths are read
+    from the token offsets instead of tokenizing every sentence again. With a
+    Hugging Face fast `tokenizer`, `n` counts that model's subword tokens, so
+    chunks fill its real context window. Without one, words and punctuation
+    are counted like NLTK's `word_tokenize`.
+    """
+    from nltk import sent_tokenize
+
+    starts = _token_starts(text, tokenizer)
+    line_start = 0
+
+    for para_id, line in enumerate(text.split("\n")):
+        stripped_line = line.strip()
+        if not stripped_line:
+            # Handle empty lines as a special chunk
+            yield "", para_id
+            line_start += len(line) + 1
+            continue
+
+        base = line_start + len(line) - len(line.lstrip())
+        line_start += len(line) + 1
+
+        current_chunk: List[str] = []
+        current_length = 0
+        position = 0
+
+        for sentence in sent_tokenize(stripped_line):
+            start = stripped_line.find(sentence, position)
+            if start < 0:
+                start = position
+            end = start + len(sentence)
+            position = end
+
+            sentence_length = bisect_left(starts, base + end) - bisect_left(
+                starts, base + start
+            )
+
+            if current_length + sentence_length <= n:
+                current_chunk.append(sentence)
+                current_length += sentence_length
+            else:
+                if current_chunk:
+                    yield " ".join(current_chunk), para_id
+                current_chunk = [sentence]
+                current_length = sentence_length
+
+        if current_chunk:
+            yield " ".join(current_chunk), para_id
+
+
+def fast_split(
+    text: str, n: int, tokenizer: Optional[Any] = None
+) -> Tuple[List[str], List[int]]:
+    """
+    Same as `smart_split`, built on `iter_split`.
+    """
+    chunks: List[str] = []
+    paragraph_ids: List[int] = []
+    for chunk, para_id in iter_split(text, n, tokenizer):
+        chunks.append(chunk)
+        paragraph_ids.append(para_id)
+    return chunks, paragraph_ids
+
+
+def pack_chunks(text: str, n: int, tokenizer: Optional[Any] = None) -> List[str]:
+    """
+    Split `text` into blocks of at most `n` tokens, packing as many whole
+    sentences into each block as fit. Line breaks between paragraphs are kept
+    and empty lines dropped. A single sentence longer than `n` gets a block
+    of its own.
+    """
+    blocks: List[str] = []
+    current: List[str] = []
+    current_length = 0
+    last_para_id = -1
+
+    for chunk, para_id in iter_split(text, n, tokenizer):
+        if not chunk:
+            continue
+
+        length = count_tokens(chunk, tokenizer)
+        if current and current_length + length > n:
+            blocks.append("".join(current))
+            current, current_length = [], 0
+
+        if current:
+            current.append(" " if para_id == last_para_id else "\n")
+        current.append(chunk)
+        current_length += length
+        last_para_id = para_id
+
+    if current:
+        blocks.append("".join(current))
+
+    return blocks
+
+
+def count_tokens(text: str, tokenizer: Optional[Any] = None) -> int:
+    """
+    Number of tokens in `text`, counted the same way as `iter_split`.
+    """
+    return len(_token_starts(text, tokenizer))
+
+
+def _token_starts(text: str, tokenizer: Optional[Any] = None) -> List[int]:
+    """
+    Sorted character offsets at which each token of `text` starts.
+    """
+    if tokenizer is None:
+        return [match.start() for match in _WORD_RE.finditer(text)]
+
+    encoding = tokenizer(
+        text,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        verbose=False,
+    )
+    return [start for start, end in encoding["offset_mapping"] if end > start]
+
+
 def smart_join(chunks, paragraph_ids):
     if len(chunks) != len(paragraph_ids):
         raise ValueError("Mismatch between chunks and paragraph IDs length")
@@ -65,13 +198,15 @@ def smart_join(chunks, paragraph_ids):
     return "\n".join(reconstructed_lines)
 
 
-def smart_rejoin_limited_full(chunks, paragraph_ids, limit):
+def smart_rejoin_limited_full(chunks, paragraph_ids, limit, tokenizer=None):
     """
     Args:
         text (str): Original full text (used to preserve exact formatting).
         chunks (List[str]): List of sentence chunks (from smart_split).
         paragraph_ids (List[int]): Corresponding paragraph index per chunk.
         limit (int): Max number of tokens per output block.
+        tokenizer: Optional Hugging Face fast tokenizer, tokens are counted
+            like `count_tokens`.
 
     Returns:
         List[str]: Token-limited rejoined text blocks, preserving exact original spacing.
@@ -117,8 +252,6 @@ def smart_rejoin_limited_full(chunks, paragraph_ids, limit):
     current_token_count = 0
 
     for line in reconstructed_lines:
-        line_token_count = len(word_tokenize(line))
-
         if line.strip() == "":
             # Pure whitespace line — push it out on its own
             if current_block:
@@ -128,6 +261,7 @@ def smart_rejoin_limited_full(chunks, paragraph_ids, limit):
             result.append(line)
             continue
 
+        line_token_count = count_tokens(line, tokenizer)
         if line_token_count > limit:
             if current_block:
                 result.append("".join(current_block))
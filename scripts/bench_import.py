@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Import-time benchmark for the scribe package.
+
+Fails (exit code 1) if a bare `import scribe` pulls in any heavy dependency
+or takes longer than the allowed budget.
+
+    python scripts/bench_import.py --runs 5 --max-seconds 0.5
+"""
+from pathlib import Path
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "spacy",
+    "sklearn",
+    "nltk",
+    "google.generativeai",
+    "ollama",
+]
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = (
+    "import sys; import scribe; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def run_once() -> tuple:
+    start_time = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start_time
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    return elapsed, loaded
+
+
+def baseline() -> float:
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - start_time
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=0.5,
+        help="Allowed median import time, on top of interpreter startup.",
+    )
+    args = parser.parse_args()
+
+    interpreter = statistics.median(baseline() for _ in range(args.runs))
+
+    timings = []
+    loaded: list = []
+    for _ in range(args.runs):
+        elapsed, loaded = run_once()
+        timings.append(elapsed - interpreter)
+
+    median = statistics.median(timings)
+    print(f"⏳ import scribe: median {median:.3f}s over {args.runs} runs")
+
+    failed = False
+    if loaded:
+        print(f"❌ heavy modules imported eagerly: {', '.join(loaded)}")
+        failed = True
+
+    if median > args.max_seconds:
+        print(f"❌ import time {median:.3f}s exceeds {args.max_seconds:.3f}s")
+        failed = True
+
+    if not failed:
+        print("✅ import scribe is lazy")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
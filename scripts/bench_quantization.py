@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Benchmark the int8 and binary storages of `VectorIndex` against float32:
+memory, scan time and recall@k of exact search, with and without rescoring.
+Memory is what each in-memory index actually holds (`VectorIndex.nbytes`),
+rescoring needs the float32 vectors kept next to the codes.
+
+    python scripts/bench_quantization.py [--count 100000] [--dim 768] [--sbert document.txt]
+
+By default the corpus is synthetic, clustered random vectors. With
+`--sbert`, the paragraphs of a document are encoded with the SBERT model
+instead.
+"""
+from scribe.index import VectorIndex
+import argparse
+import time
+
+import numpy as np
+
+
+def timed(name, func, *args, repeat=3, **kwargs):
+    print(f"⏳ Starting '{name}'...")
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.time()
+        result = func(*args, **kwargs)
+        best = min(best, time.time() - start_time)
+    print(f"✅ Finished '{name}' in {best:.3f} seconds (best of {repeat})\n")
+    return result, best
+
+
+def synthetic(count, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 500), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), count)
+    noise = rng.normal(size=(count, dim)).astype(np.float32)
+    return centers[labels] + noise
+
+
+def sbert_corpus(path):
+    from scribe.similarity import Similarity
+
+    with open(path, encoding="utf-8") as f:
+        paragraphs = [p.strip() for p in f.read().split("\n") if p.strip()]
+    return Similarity().sbert_encode(paragraphs)
+
+
+def recall(truth, results):
+    hits = [
+        len({i for i, _ in t} & {i for i, _ in r}) / max(1, len(t))
+        for t, r in zip(truth, results)
+    ]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=100)
+    parser.add_argument("--sbert", help="Encode the paragraphs of this document")
+    args = parser.parse_args()
+
+    if args.sbert:
+        vectors = sbert_corpus(args.sbert)
+    else:
+        vectors = synthetic(args.count, args.dim)
+    count, dim = vectors.shape
+
+    # Queries are noisy copies of corpus vectors, like resubmitted text.
+    rng = np.random.default_rng(1)
+    picked = rng.choice(count, min(args.queries, count), replace=False)
+    noise = rng.normal(size=(len(picked), dim)).astype(np.float32)
+    queries = vectors[picked] + 0.5 * np.abs(vectors[picked]).mean() * noise
+
+    ids = [str(i) for i in range(count)]
+    print(f"Corpus: {count:,} vectors of {dim} dimensions\n")
+
+    baseline = VectorIndex(storage="float32")
+    baseline.add(ids, vectors)
+    truth, base_time = timed(
+        "float32 exact search", baseline.search, queries, args.top_k
+    )
+
+    rows = [("float32", baseline.nbytes, base_time, 1.0)]
+    for storage in ["int8", "binary"]:
+        index = VectorIndex(storage=storage)
+        index.add(ids, vectors)
+
+        results, scan_time = timed(
+            f"{storage} exact search", index.search, queries, args.top_k
+        )
+        rows.append((storage, index.nbytes, scan_time, recall(truth, results)))
+
+        index = VectorIndex(storage=storage, keep_vectors=True)
+        index.add(ids, vectors)
+
+        results, rescore_time = timed(
+            f"{storage} search, rescoring {args.rescore}",
+            index.search,
+            queries,
+            args.top_k,
+            rescore=args.rescore,
+        )
+        rows.append(
+            (
+                f"{storage} + rescore",
+                index.nbytes,
+                rescore_time,
+                recall(truth, results),
+            )
+        )
+
+    recall_k = f"recall@{args.top_k}"
+    print(f"{'storage':<18}{'memory':>12}{'smaller':>9}{'time':>10}{recall_k:>11}")
+    for name, size, seconds, hits in rows:
+        print(
+            f"{name:<18}{size / 2**20:>10.1f}MB{rows[0][1] / size:>8.1f}x"
+            f"{seconds:>9.3f}s{hits:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Benchmark `fast_split` against `smart_split`.
+
+    python scripts/bench_split.py [document.txt] [--chunk-size 100] [--tokenizer t5-base]
+"""
+from scribe.utils import fast_split, smart_split
+import argparse
+import time
+
+SAMPLE = (
+    "Artificial intelligence is transforming industries across the globe. "
+    "It offers opportunities for innovation and growth, but it also raises "
+    "questions about fairness, privacy and accountability.\n"
+    "Researchers have proposed many methods to evaluate these systems.\n"
+    "\n"
+)
+
+
+def timed(name, func, *args, repeat=3, **kwargs):
+    print(f"⏳ Starting '{name}'...")
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.time()
+        result = func(*args, **kwargs)
+        best = min(best, time.time() - start_time)
+    print(f"✅ Finished '{name}' in {best:.3f} seconds (best of {repeat})\n")
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("document", nargs="?")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--tokenizer", help="Hugging Face fast tokenizer name")
+    args = parser.parse_args()
+
+    if args.document:
+        with open(args.document, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = SAMPLE * 2000
+
+    print(f"Document: {len(text):,} characters, {text.count(chr(10)):,} lines\n")
+
+    (chunks, ids), slow = timed("smart_split", smart_split, text, args.chunk_size)
+    (fast_chunks, fast_ids), fast = timed(
+        "fast_split", fast_split, text, args.chunk_size
+    )
+
+    same = sum(a == b for a, b in zip(chunks, fast_chunks))
+    print(f"Speedup: {slow / fast:.1f}x")
+    print(f"Chunks: {len(chunks)} vs {len(fast_chunks)}, {same} identical\n")
+
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, use_fast=True)
+        (tok_chunks, _), _ = timed(
+            f"fast_split ({args.tokenizer})",
+            fast_split,
+            text,
+            args.chunk_size,
+            tokenizer=tokenizer,
+        )
+        longest = max(
+            len(tokenizer(c, add_special_tokens=False)["input_ids"])
+            for c in tok_chunks
+        )
+        print(f"Chunks: {len(tok_chunks)}, longest {longest} tokens")
+
+
+if __name__ == "__main__":
+    main()
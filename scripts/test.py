@@ -26,6 +26,10 @@ llm = LLM()
 
 summary_gemini = timed("Gemini Summary", llm.summarize, result)
 
+summary_gemini_mr = timed(
+    "Gemini Summary (map-reduce)", llm.summarize, result, map_reduce=True
+)
+
 llm = LLM(provider="ollama")
 
 summary_ollama = timed("Ollama Summary", llm.summarize, result)